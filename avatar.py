@@ -0,0 +1,128 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from PIL import Image, ImageDraw
+from settings import AVATAR_CACHE_DIR, AVATAR_CACHE_MAX_BYTES
+
+IDENTICON_VERSION = 1
+IDENTICON_GRID = 5
+BACKGROUND_COLOR = (240, 240, 240)
+
+
+def make_identicon(seed, size):
+    """
+    Сформировать аватар-идентикон: симметричный узор 5x5, однозначно задаваемый строкой
+
+    :param str seed: Строка, относительно которой формируется аватар (e-mail)
+    :param int size: Размер стороны аватара в пикселях
+    :rtype PIL.Image.Image
+    """
+    digest = hashlib.md5(seed.encode('utf-8')).digest()
+    color = tuple(64 + byte % 160 for byte in digest[:3])
+    cell = size // IDENTICON_GRID
+    margin = (size - cell * IDENTICON_GRID) // 2
+    image = Image.new(mode='RGB', size=(size, size), color=BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+    half = (IDENTICON_GRID + 1) // 2
+    for row in range(IDENTICON_GRID):
+        for column in range(half):
+            bit = row * half + column
+            if not digest[3 + bit // 8] >> (bit % 8) & 1:
+                continue
+            for x in {column, IDENTICON_GRID - 1 - column}:
+                left, top = margin + x * cell, margin + row * cell
+                draw.rectangle(xy=(left, top, left + cell - 1, top + cell - 1), fill=color)
+    return image
+
+
+class AvatarCache:
+    """
+    Кэш аватаров на диске.
+    Имя файла - хэш параметров аватара, поэтому одинаковые аватары не формируются повторно
+    и могут использоваться несколькими процессами. Размер кэша учитывается в памяти: каталог
+    просматривается при первой записи и когда размер превысит лимит. Тогда удаляются файлы,
+    к которым дольше всего не обращались, пока размер не станет ниже SHRINK_TARGET лимита.
+    Файлы, записанные другими процессами, учитываются при очередном просмотре каталога.
+    """
+    SHRINK_TARGET = 0.9
+
+    def __init__(self, directory, max_bytes):
+        """
+        :param pathlib.Path directory: Каталог кэша
+        :param int max_bytes: Максимальный суммарный размер файлов кэша в байтах
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = None
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def get(self, seed, size):
+        """
+        Получить аватар из кэша или сформировать новый
+
+        :param str seed: Строка, относительно которой формируется аватар
+        :param int size: Размер стороны аватара в пикселях
+        :rtype PIL.Image.Image
+        """
+        key = hashlib.sha1(f'{IDENTICON_VERSION}:{size}:{seed}'.encode('utf-8')).hexdigest()
+        path = self.directory / f'{key}.png'
+        try:
+            avatar = Image.open(path)
+            avatar.load()
+            os.utime(path)
+            return avatar
+        except OSError:
+            pass
+        avatar = make_identicon(seed=seed, size=size)
+        self._save(avatar=avatar, path=path)
+        return avatar
+
+    def _save(self, avatar, path):
+        """ Атомарная запись аватара в кэш """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.directory), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                avatar.save(file, 'png')
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, str(path))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self.total_bytes is None:
+                self._shrink()
+            else:
+                self.total_bytes += size
+                self.count += 1
+                if self.total_bytes > self.max_bytes:
+                    self._shrink()
+
+    def _shrink(self):
+        """ Пересчитать размер кэша и удалить давно не использовавшиеся файлы сверх лимита """
+        files = []
+        for entry in os.scandir(str(self.directory)):
+            if entry.name.endswith('.png'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        count = len(files)
+        if total > self.max_bytes:
+            for _, size, file_path in sorted(files):
+                if total <= self.max_bytes * self.SHRINK_TARGET:
+                    break
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                count -= 1
+        self.total_bytes = total
+        self.count = count
+
+
+avatar_cache = AvatarCache(directory=AVATAR_CACHE_DIR, max_bytes=AVATAR_CACHE_MAX_BYTES)
@@ -0,0 +1,260 @@
+"""
+Набор микробенчмарков горячих путей бота с контролем регрессий.
+
+Запуск из корня проекта:
+    python -m benchmarks.suite run [--output results.json] [--only find_intent ...]
+    python -m benchmarks.suite compare benchmarks/baseline.json [results.json] [--threshold 0.2]
+
+run замеряет все пути и сохраняет результат в JSON. Базовый результат хранится в
+benchmarks/baseline.json и обновляется после намеренного изменения производительности.
+compare сравнивает результат (или новый замер, если файл не указан) с базовым и
+завершается с кодом 1, если какой-либо путь стал медленнее больше чем на threshold.
+БД - временная SQLite (или --db URL), API ВК имитируется FakeVk.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+import database_model
+import settings
+from benchmarks.loadtest import GROUP_ID, prepare_database
+from bot import ChatBot
+from database import db_handler, unit_of_work
+from fake_vk import FakeVk
+from intent_matcher import Utterance
+from render_service import RenderService
+from ticket_maker import TicketJob, TicketMaker
+
+DEFAULT_THRESHOLD = 0.2
+REPEAT = 5
+MIN_TIME = 0.2
+
+UTTERANCES = [
+    'Привет!', 'привет', 'Здорова', 'Добрый вечер', 'доброе утро!', 'Когда будет конференция?', 'Какая дата?',
+    'Где будет?', 'Адрес подскажи', 'какое место?', 'Хочу зарегистрироваться', 'Как записаться?',
+    'Как дела?', 'спасибо', 'Привет, где и когда будет митап?', 'ok',
+]
+JOB = TicketJob(title='Конференция Moscow Python Meetup №73',
+                location='01.04.2020, БЦ "Олимпия Парк", Ленинградское ш. 39Ас2',
+                note='Регистрация с 10:00 до 11:00', name='Владимир', email='vladimir@example.com')
+
+
+class BenchmarkBot:
+    """ ChatBot с имитацией API ВК и отрисовкой билетов в вызывающем потоке """
+
+    def __init__(self):
+        self.bot = ChatBot(token='', group_id=GROUP_ID)
+        self.bot.init_api(vk=FakeVk())
+        self.bot.renderer = RenderService(max_workers=0, max_queue=settings.RENDER_QUEUE_SIZE,
+                                          timeout=settings.RENDER_TIMEOUT)
+        self.bot.outbox.start()
+        self.user_ids = itertools.count(2000000)
+
+    def close(self):
+        self.bot.outbox.stop()
+
+
+def bench_words_matcher(fixture):
+    intent = settings.INTENTS[0]
+    patterns = [Utterance(text).words for text in UTTERANCES]
+
+    def run():
+        for words in patterns:
+            ChatBot.words_matcher(standard=intent['tokens'], patterns=words, min_ratio=intent['min_ratio'])
+    return run, len(patterns)
+
+
+def bench_find_intent(fixture):
+    bot = fixture.bot
+    user_id = next(fixture.user_ids)
+    with unit_of_work():
+        bot.dialogs[user_id].flush()
+
+    def run():
+        # Замеряется поиск намерения, а не попадание в кэш решений
+        bot.intent_matcher.decisions.clear()
+        with unit_of_work():
+            for text in UTTERANCES:
+                bot.find_intent(utterance=Utterance(text), user_id=user_id)
+                bot.dialogs[user_id].scenario_state = None
+    return run, len(UTTERANCES)
+
+
+def bench_continue_scenario(fixture):
+    bot = fixture.bot
+
+    def run():
+        user_id = next(fixture.user_ids)
+        with unit_of_work():
+            user = bot.dialogs[user_id]
+            bot.find_intent(utterance=Utterance('Хочу зарегистрироваться'), user_id=user_id)
+            bot.continue_scenario(text='Владимир', user_id=user_id)
+            bot.continue_scenario(text='vladimir@example.com', user_id=user_id)
+            user.flush()
+        bot.send_pending_images(user_id=user_id)
+    return run, 1
+
+
+def bench_get_user_info(fixture):
+    user_id = next(fixture.user_ids)
+    with unit_of_work():
+        database_model.get_user_info(user_id=user_id, create=True)
+
+    def run():
+        with unit_of_work():
+            database_model.get_user_info(user_id=user_id)
+    return run, 1
+
+
+def bench_dialog_to_db(fixture):
+    bot = fixture.bot
+    user_ids = [next(fixture.user_ids) for _ in range(100)]
+
+    def run():
+        for user_id in user_ids:
+            bot.dialog_to_db(user_id=user_id)
+        bot.dialog_writer.flush()
+    return run, len(user_ids)
+
+
+def bench_ticket_render(fixture):
+    def run():
+        ticket = TicketMaker.for_event(title=JOB.title, location=JOB.location, note=JOB.note)
+        ticket.write_name(name=JOB.name)
+        ticket.draw_avatar(ava_str=JOB.email)
+    return run, 1
+
+
+def bench_ticket_image_io(fixture):
+    ticket = TicketMaker.for_event(title=JOB.title, location=JOB.location, note=JOB.note)
+    ticket.write_name(name=JOB.name)
+    ticket.draw_avatar(ava_str=JOB.email)
+
+    def run():
+        ticket.image_io.getvalue()
+    return run, 1
+
+
+BENCHMARKS = {
+    'words_matcher': bench_words_matcher,
+    'find_intent': bench_find_intent,
+    'continue_scenario': bench_continue_scenario,
+    'get_user_info': bench_get_user_info,
+    'dialog_to_db': bench_dialog_to_db,
+    'ticket_render': bench_ticket_render,
+    'ticket_image_io': bench_ticket_image_io,
+}
+
+
+def measure(run, operations):
+    """
+    Замер времени одной операции
+
+    :param callable run: Функция, выполняющая operations операций
+    :param int operations: Число операций за вызов run
+    :return dict: Минимальное и медианное время операции в микросекундах
+    """
+    run()
+    timer = timeit.Timer(run)
+    number, elapsed = timer.autorange()
+    # число повторов подбирается по пробному замеру так, чтобы серия длилась около MIN_TIME
+    number = max(1, round(number * MIN_TIME / elapsed))
+    times = sorted(elapsed / number / operations * 1e6 for elapsed in timer.repeat(repeat=REPEAT, number=number))
+    return {'min_us': times[0], 'median_us': times[len(times) // 2], 'loops': number * operations}
+
+
+def run_suite(only=None, db=None):
+    """
+    Замер всех (или выбранных) путей
+
+    :param list only: Имена замеряемых путей
+    :param str db: Адрес БД (по умолчанию - временная SQLite)
+    :return dict: Результат в формате JSON-файла
+    """
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        prepare_database(db or 'sqlite:///' + os.path.join(directory, 'benchmarks.db'))
+        fixture = BenchmarkBot()
+        try:
+            for name, benchmark in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                results[name] = measure(*benchmark(fixture))
+                print(f"{name:20} {results[name]['min_us']:12.1f} мкс", file=sys.stderr)
+        finally:
+            fixture.close()
+            db_handler.close()
+    return {'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results}
+
+
+def compare(baseline, current, threshold):
+    """
+    Сравнение результата с базовым
+
+    :param dict baseline: Базовый результат
+    :param dict current: Новый результат
+    :param float threshold: Допустимое замедление (0.2 - на 20%)
+    :return list: Имена путей, замедлившихся больше допустимого
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:20} {result["min_us"]:12.1f} мкс   (нет в базовом результате)')
+            continue
+        change = result['min_us'] / base['min_us'] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f'{name:20} {base["min_us"]:12.1f} -> {result["min_us"]:10.1f} мкс  {change:+7.1%}'
+              + ('  РЕГРЕССИЯ' if regressed else ''))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарки горячих путей бота')
+    suite_parser = argparse.ArgumentParser(add_help=False)
+    suite_parser.add_argument('--db', help='Адрес БД (по умолчанию - временная SQLite)')
+    suite_parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Замерить только эти пути')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    run_parser = commands.add_parser('run', parents=[suite_parser], help='Замерить и сохранить результат')
+    run_parser.add_argument('--output', help='Файл результата (по умолчанию - вывод в консоль)')
+    compare_parser = commands.add_parser('compare', parents=[suite_parser], help='Сравнить с базовым результатом')
+    compare_parser.add_argument('baseline', help='Файл базового результата')
+    compare_parser.add_argument('current', nargs='?', help='Файл результата (по умолчанию - новый замер)')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='Допустимое замедление (0.2 - на 20%%)')
+    args = parser.parse_args()
+    if args.command == 'run':
+        result = run_suite(only=args.only, db=args.db)
+        if args.output:
+            with open(args.output, 'w', encoding='UTF-8') as output:
+                json.dump(result, output, indent=2)
+        else:
+            print(json.dumps(result, indent=2))
+        return
+    with open(args.baseline, encoding='UTF-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    if args.current:
+        with open(args.current, encoding='UTF-8') as current_file:
+            current = json.load(current_file)
+    else:
+        current = run_suite(only=args.only, db=args.db)
+    regressions = compare(baseline=baseline, current=current, threshold=args.threshold)
+    if regressions:
+        print(f'Замедлились больше чем на {args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Замер времени отрисовки билета без кэша шрифтов и с кэшем.
+Запуск из корня проекта: python -m benchmarks.ticket_render
+"""
+import timeit
+
+import ticket_maker
+from ticket_maker import TicketMaker
+
+TITLE = 'Конференция Moscow Python Meetup №73'
+LOCATION = '01.04.2020, БЦ "Олимпия Парк", Ленинградское ш. 39Ас2'
+NOTE = 'Регистрация с 10:00 до 11:00'
+NAME = 'Владимир'
+
+
+def render():
+    """ Отрисовка текста билета """
+    ticket = TicketMaker()
+    ticket.write_title(title=TITLE)
+    ticket.write_name(name=NAME)
+    ticket.write_location(location=LOCATION)
+    ticket.write_note(note=NOTE)
+
+
+def render_cold():
+    """ Отрисовка с пустым кэшем шрифтов, как без кэширования """
+    ticket_maker.get_font.cache_clear()
+    ticket_maker.get_text_size.cache_clear()
+    render()
+
+
+def main(number=50):
+    render()
+    cold = timeit.timeit(render_cold, number=number) / number
+    render()
+    warm = timeit.timeit(render, number=number) / number
+    print(f'без кэша шрифтов: {cold * 1000:.2f} мс/билет')
+    print(f'с кэшем шрифтов:  {warm * 1000:.2f} мс/билет')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
 from random import randint
+import asyncio
 import difflib
-import re
+import importlib
+import signal
+import sys
 
-import requests
 from vk_api import VkApi
 from vk_api.bot_longpoll import VkBotLongPoll, VkBotEventType
 import logging
 import logging.config
 import log_config
+import metrics
 import settings
 import handlers
-from database import DialogsDatabase
-from exceptions import DuplicateKeyError
-import database_model
+from callback_server import CallbackServer, parse_event
+from database import DialogsDatabase, get_pool, unit_of_work, warm_up_pool
+from dialog_writer import LastDialogWriter
+from dispatcher import OrderedDispatcher
+from event_cache import upcoming_events
+from intent_matcher import NOT_CLASSIFIED, IntentMatcher, Utterance
+from metrics import STAGE_LATENCY, Gauge, MetricsServer, timed
+from outbox import VkOutbox
+from photo_uploader import PhotoUploader
+from profiler import PROFILER
+from profile_collector import ProfileCollector
+from render_service import RenderService
+from scenario import compile_scenarios, validate_intents
+from session_cache import SessionCache
 from vk_user import UserState, VkUser
 
 
@@ -33,15 +48,50 @@ class ChatBot:
         self.vk = None
         self.api = None
         self.bot_longpoll = None
+        self.uploader = None
+        self.outbox = None
+        self.profile_collector = None
+        self.metrics_server = None
         logging.config.dictConfig(log_config.CONFIG)
         self.log = logging.getLogger('bot')
         DialogsDatabase()
-        self.dialogs = dict()
+        self.scenarios = compile_scenarios(scenarios=settings.SCENARIOS, handlers=handlers)
+        validate_intents(intents=settings.INTENTS, scenarios=self.scenarios, handlers=handlers)
+        self.intent_matcher = IntentMatcher(intents=settings.INTENTS)
+        self.dialogs = SessionCache(loader=VkUser, maxsize=settings.SESSION_CACHE_SIZE,
+                                    ttl=settings.SESSION_CACHE_TTL)
+        self.cache_sessions = True
+        self.pending_images = dict()
+        self.renderer = RenderService(max_workers=settings.RENDER_WORKERS, max_queue=settings.RENDER_QUEUE_SIZE,
+                                      timeout=settings.RENDER_TIMEOUT)
+        self.dialog_writer = LastDialogWriter(flush_interval=settings.DIALOG_FLUSH_INTERVAL,
+                                              flush_size=settings.DIALOG_FLUSH_SIZE)
+
+    def reload_config(self):
+        """
+        Перечитать намерения и сценарии из settings без перезапуска бота.
+        При ошибке в описании продолжают действовать прежние намерения и сценарии.
+
+        :return bool: Новые намерения и сценарии применены
+        """
+        try:
+            config = importlib.reload(settings)
+            scenarios = compile_scenarios(scenarios=config.SCENARIOS, handlers=handlers)
+            validate_intents(intents=config.INTENTS, scenarios=scenarios, handlers=handlers)
+            intent_matcher = IntentMatcher(intents=config.INTENTS)
+        except Exception:
+            self.log.exception(Exception)
+            return False
+        # Новый IntentMatcher начинает с пустого кэша решений
+        self.scenarios, self.intent_matcher = scenarios, intent_matcher
+        self.log.info('Intents and scenarios are reloaded')
+        return True
 
     @staticmethod
     def words_matcher(standard, patterns, min_ratio):
         """
-        Функция попытки определения контекста фразы по ключевым словам
+        Функция попытки определения контекста фразы по ключевым словам.
+        Эталонная реализация: при поиске намерения используется IntentMatcher с тем же результатом.
 
         :param list standard: список эталонных слов, для которых устанавливается схожесть
         :param list patterns: список слов, схожесть которых устанавливается с эталонными
@@ -54,84 +104,320 @@ class ChatBot:
                 return True
         return False
 
-    def connect(self):
-        """ Соединение с ВК """
-        self.vk = VkApi(token=self.token)
-        self.api = self.vk.get_api()
-        self.bot_longpoll = VkBotLongPoll(vk=self.vk, group_id=self.group_id)
+    def connect(self, longpoll=True):
+        """
+        Соединение с ВК
+
+        :param bool longpoll: Подключиться к long poll (при приеме событий через Callback API не нужно)
+        """
+        vk = VkApi(token=self.token)
+        vk.RPS_DELAY = 1 / settings.VK_API_RATE
+        self.init_api(vk=vk)
+        if longpoll:
+            self.bot_longpoll = VkBotLongPoll(vk=self.vk, group_id=self.group_id)
         self.log.info('Connected to VK and started to listen to')
 
+    def init_api(self, vk):
+        """
+        Настройка работы с API ВК через сессию vk (в том числе имитацию FakeVk)
+
+        :param VkApi vk: Сессия ВК
+        """
+        self.vk = vk
+        metrics.instrument_vk(self.vk)
+        self.api = self.vk.get_api()
+        self.uploader = PhotoUploader(api=self.api, session=self.vk.http, upload_url_ttl=settings.UPLOAD_URL_TTL,
+                                      upload_timeout=settings.UPLOAD_TIMEOUT, cache_size=settings.ATTACHMENT_CACHE_SIZE,
+                                      cache_ttl=settings.ATTACHMENT_CACHE_TTL)
+        self.outbox = VkOutbox(vk=self.vk, rate=settings.VK_API_RATE, max_retries=settings.VK_API_MAX_RETRIES,
+                               backoff=settings.VK_API_BACKOFF)
+        self.profile_collector = ProfileCollector(outbox=self.outbox, api_version=self.__vk_api_version,
+                                                  flush_interval=settings.PROFILE_FLUSH_INTERVAL,
+                                                  batch_size=settings.PROFILE_BATCH_SIZE,
+                                                  on_collected=self.update_user_names)
+
+    def start_workers(self):
+        """ Запуск фоновых обработчиков """
+        warm_up_pool()
+        self.dialog_writer.start()
+        upcoming_events.start_listening()
+        if self.outbox is not None:
+            self.outbox.start()
+            self.profile_collector.start()
+        if metrics.ENABLED:
+            self.start_metrics_server()
+
+    def stop_workers(self):
+        """ Остановка фоновых обработчиков с сохранением накопленных данных """
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.outbox is not None:
+            self.profile_collector.stop()
+            self.outbox.stop()
+        upcoming_events.stop_listening()
+        self.dialog_writer.stop()
+        self.renderer.shutdown()
+
+    def start_metrics_server(self):
+        """ Запуск HTTP-сервера метрик с показателями очередей, кэшей и пула соединений с БД """
+        metrics.REGISTRY.register(Gauge('bot_sessions', 'Users in the session cache', lambda: len(self.dialogs)))
+        metrics.REGISTRY.register(Gauge('bot_intent_cache_hit_rate', 'Share of messages with a cached intent decision',
+                                        lambda: self.intent_matcher.decisions.hit_rate))
+        if self.outbox is not None:
+            metrics.REGISTRY.register(Gauge('bot_outbox_queue_depth', 'VK API calls waiting in the outbox',
+                                            lambda: self.outbox.queue_depth))
+        pool = get_pool()
+        if pool is not None:
+            for key, documentation in (('in_use', 'Database connections checked out of the pool'),
+                                       ('idle', 'Idle database connections in the pool'),
+                                       ('wait_avg', 'Average wait for a database connection in seconds'),
+                                       ('wait_max', 'Maximum wait for a database connection in seconds'),
+                                       ('health_check_failures', 'Pooled connections that failed a health check')):
+                metrics.REGISTRY.register(Gauge(f'bot_db_pool_{key}', documentation,
+                                                lambda key=key: pool.stats[key]))
+        self.metrics_server = MetricsServer()
+        self.metrics_server.start()
+        self.log.info(f'Metrics are served on port {self.metrics_server.port}')
+
     def run(self):
         """ Запуск бота """
         try:
             self.connect()
+            self.start_workers()
             for event in self.bot_longpoll.listen():
-                if event.type.value.startswith('message_'):
+                if self.is_message_event(event):
                     self.message_handling(event)
         except Exception:
             self.log.exception(Exception)
             print(Exception)
+        finally:
+            self.stop_workers()
+
+    def run_async(self, max_in_flight=settings.MAX_EVENTS_IN_FLIGHT):
+        """
+        Запуск бота в асинхронном режиме: события разных пользователей обрабатываются
+        параллельно, события одного пользователя - в порядке поступления
+
+        :param int max_in_flight: Максимальное число одновременно обрабатываемых событий
+        """
+        try:
+            self.connect()
+            self.start_workers()
+            asyncio.run(self.listen_async(max_in_flight=max_in_flight))
+        except Exception:
+            self.log.exception(Exception)
+            print(Exception)
+        finally:
+            self.stop_workers()
+
+    async def listen_async(self, max_in_flight):
+        """
+        Чтение long poll и передача событий диспетчеру
+
+        :param int max_in_flight: Максимальное число одновременно обрабатываемых событий
+        """
+        loop = asyncio.get_event_loop()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            dispatcher = OrderedDispatcher(handler=self.message_handling, max_in_flight=max_in_flight,
+                                           executor=executor)
+            try:
+                while True:
+                    events = await loop.run_in_executor(None, self.bot_longpoll.check)
+                    events = [event for event in events if self.is_message_event(event)]
+                    for event, intent in zip(events, self.classify_events(events)):
+                        dispatcher.submit(self.get_event_user_id(event), event, intent)
+            finally:
+                await dispatcher.join()
+
+    def run_callback(self, confirmation_code, secret=None, host=settings.CALLBACK_HOST, port=settings.CALLBACK_PORT,
+                     max_in_flight=settings.MAX_EVENTS_IN_FLIGHT, cache_sessions=settings.CALLBACK_CACHE_SESSIONS):
+        """
+        Запуск бота с приемом событий через Callback API вместо long poll.
+        Несколько экземпляров можно запустить за балансировщиком нагрузки. Тогда сессии
+        пользователей не кэшируются между событиями: каждое событие читает данные пользователя
+        из БД и записывает изменения в той же транзакции. События одного пользователя
+        обрабатываются по порядку только в пределах экземпляра, поэтому балансировщику
+        следует направлять события одного peer_id на один экземпляр.
+
+        :param str confirmation_code: Строка для подтверждения адреса сервера
+        :param str secret: Секретный ключ из настроек Callback API
+        :param str host: Адрес, на котором принимаются запросы
+        :param int port: Порт
+        :param int max_in_flight: Максимальное число одновременно обрабатываемых событий
+        :param bool cache_sessions: Кэшировать сессии между событиями (только для одного экземпляра)
+        """
+        self.cache_sessions = cache_sessions
+        try:
+            self.connect(longpoll=False)
+            self.start_workers()
+            asyncio.run(self.serve_callback(confirmation_code=confirmation_code, secret=secret, host=host, port=port,
+                                            max_in_flight=max_in_flight))
+        except Exception:
+            self.log.exception(Exception)
+            print(Exception)
+        finally:
+            self.stop_workers()
+
+    async def serve_callback(self, confirmation_code, secret, host, port, max_in_flight, started=None):
+        """
+        Прием событий Callback API и передача их диспетчеру
+
+        :param str confirmation_code: Строка для подтверждения адреса сервера
+        :param str secret: Секретный ключ из настроек Callback API
+        :param str host: Адрес, на котором принимаются запросы
+        :param int port: Порт (0 - любой свободный)
+        :param int max_in_flight: Максимальное число одновременно обрабатываемых событий
+        :param asyncio.Future started: Future, в который передается запущенный сервер
+        """
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            dispatcher = OrderedDispatcher(handler=self.message_handling, max_in_flight=max_in_flight,
+                                           executor=executor)
+
+            def on_event(raw):
+                event = parse_event(raw)
+                if self.is_message_event(event):
+                    intent, = self.classify_events([event])
+                    dispatcher.submit(self.get_event_user_id(event), event, intent)
+
+            server = CallbackServer(on_event=on_event, group_id=self.group_id, confirmation_code=confirmation_code,
+                                    secret=secret, host=host, port=port)
+            await server.start()
+            if started is not None:
+                started.set_result(server)
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await server.stop()
+                await dispatcher.join()
+
+    @staticmethod
+    def is_message_event(event):
+        """
+        Проверить, что событие - message_*.
+        Тип события, неизвестного vk_api, - строка, а не VkBotEventType, поэтому проверяется исходный тип.
+
+        :param VkBotEvent event: Событие
+        :rtype bool
+        """
+        return event.raw['type'].startswith('message_')
+
+    @staticmethod
+    def get_event_user_id(event):
+        """
+        Получить id пользователя - источника события message_*
+
+        :param VkBotEventType event: Событие VkBotEventType
+        :return int: id пользователя
+        """
+        if event.type == VkBotEventType.MESSAGE_NEW:
+            return event.message.from_id
+        return event.obj.get('from_id')
+
+    def classify_events(self, events):
+        """
+        Поиск намерений сразу для всех сообщений пакета событий long poll.
+        Результат используется, если на момент обработки пользователь не находится в сценарии.
+
+        :param list events: События message_*
+        :return list: Намерения (None - намерение не найдено, NOT_CLASSIFIED - не сообщение) в порядке событий
+        """
+        utterances = [Utterance(event.message.text) for event in events if event.type == VkBotEventType.MESSAGE_NEW]
+        intents = iter(self.intent_matcher.match_batch(texts=utterances))
+        return [next(intents) if event.type == VkBotEventType.MESSAGE_NEW else NOT_CLASSIFIED for event in events]
+
+    @timed(STAGE_LATENCY)
+    @PROFILER.profile
+    def message_handling(self, event, intent=NOT_CLASSIFIED):
+        """
+        Обработка событий message_*.
+        Картинки, подготовленные при обработке, отрисовываются и загружаются в ВК после фиксации
+        транзакции события, чтобы долгие вызовы не удерживали соединение с БД и блокировки.
+
+        :param VkBotEventType event: Событие VkBotEventType
+        :param dict intent: Намерение, найденное для пакета событий (см. classify_events)
+        """
+        with unit_of_work():
+            self.handle_event(event, intent=intent)
+        if event.type == VkBotEventType.MESSAGE_NEW:
+            self.send_pending_images(user_id=event.message.from_id)
 
-    def message_handling(self, event):
+    def handle_event(self, event, intent=NOT_CLASSIFIED):
         """
-        Обработка событий message_*
+        Обработка события message_* в рамках единицы работы с БД
 
         :param VkBotEventType event: Событие VkBotEventType
+        :param dict intent: Намерение, найденное для пакета событий (см. classify_events)
         """
         if event.type == VkBotEventType.MESSAGE_NEW:
             user_id = event.message.from_id
-            text = re.sub(pattern=settings.RE_MULTIPLE_SPACES, repl=' ', string=event.message.text.strip())
+            utterance = Utterance(event.message.text)
+            text = utterance.text
             self.log.info(f'message from user {user_id}: {text}')
-            self.dialogs[user_id] = VkUser(user_id=user_id)
-            if self.dialogs[user_id].scenario_state:
-                message_text = self.continue_scenario(text=text, user_id=user_id)
-            else:
-                message_text = self.find_intent(text=text, user_id=user_id)
-            self.send_message(message_text=message_text, user_id=user_id)
-            self.dialog_to_db(user_id=user_id)
-            if self.dialogs[user_id].is_need_to_collect_user_info():
-                self.collect_user_info(user_id=user_id)
+            if not self.cache_sessions:
+                # данные пользователя могли измениться другим экземпляром бота
+                self.dialogs.invalidate(user_id)
+            user = self.dialogs[user_id]
+            try:
+                if user.scenario_state:
+                    message_text = self.continue_scenario(text=text, user_id=user_id)
+                else:
+                    message_text = self.find_intent(utterance=utterance, user_id=user_id, intent=intent)
+                self.send_message(message_text=message_text, user_id=user_id)
+                self.dialog_to_db(user_id=user_id)
+                if user.is_need_to_collect_user_info():
+                    self.collect_user_info(user_id=user_id)
+                user.flush()
+            except Exception:
+                # транзакция единицы работы откатывается, данные пользователя перечитываются из БД
+                self.dialogs.invalidate(user_id)
+                self.pending_images.pop(user_id, None)
+                raise
         elif event.type == VkBotEventType.MESSAGE_TYPING_STATE:
             self.log.info(f'User {event.obj.from_id} is typing...')
 
     def collect_user_info(self, user_id):
         """
-        Собрать дополнительную информацию о собеседнике
+        Собрать дополнительную информацию о собеседнике.
+        Информация запрашивается в фоне пакетами (см. ProfileCollector).
 
         :param user_id: id пользователя
         """
-        info = self.api.users.get(user_ids=user_id, fields='photo_50,city', v=self.__vk_api_version)
-        user_name = '{} {}'.format(info[0]['last_name'], info[0]['first_name']).strip()
-        if user_name:
-            self.dialogs[user_id].user_name = user_name
+        self.profile_collector.add(user_id=user_id)
+
+    def update_user_names(self, user_names):
+        """
+        Обновить имена пользователей, собранные ProfileCollector, в сессиях
 
-    def find_intent(self, text, user_id):
+        :param dict user_names: Словарь {id пользователя: имя пользователя}
         """
-        Поиск сценария работы
+        for user_id, user_name in user_names.items():
+            user = self.dialogs.peek(user_id)
+            if user is not None:
+                user.refresh(user_name=user_name)
 
-        :param str text: Полученное от пользователя сообщение
+    @timed(STAGE_LATENCY)
+    def find_intent(self, utterance, user_id, intent=NOT_CLASSIFIED):
+        """
+        Поиск сценария работы.
+        Решения для повторяющихся сообщений берутся из кэша IntentMatcher.
+
+        :param Utterance utterance: Полученное от пользователя сообщение
         :param user_id: id пользователя
+        :param dict intent: Намерение, уже найденное для этого сообщения (см. classify_events)
         :return str: Строка сообщения собеседнику для отправки
         """
-        for intent in settings.INTENTS:
-            needed = False
-            if intent['tokens'] is not None:
-                needed = self.words_matcher(standard=intent['tokens'],
-                                            patterns=re.findall(pattern=r'(\w+)', string=text),
-                                            min_ratio=intent['min_ratio'])
-            elif intent['re_token'] is not None:
-                needed = bool(re.findall(pattern=intent['re_token'], string=text))
-            if not needed:
-                continue
-            if intent['scenario'] is not None:
-                return self.start_scenario(scenario_name=intent['scenario'], user_id=user_id)
-            elif intent['handler'] is not None:
-                handler = getattr(handlers, intent['handler'])
-                return handler(user_id=user_id, text=text, content=None)
-            else:
-                return intent['answer']
-        else:
+        if intent is NOT_CLASSIFIED:
+            intent = self.intent_matcher.match(text=utterance)
+        if intent is None:
             return settings.DEFAULT_ANSWER
+        if intent['scenario'] is not None:
+            return self.start_scenario(scenario_name=intent['scenario'], user_id=user_id)
+        elif intent['handler'] is not None:
+            handler = getattr(handlers, intent['handler'])
+            return handler(user_id=user_id, user=self.dialogs[user_id], text=utterance.text, content=None)
+        else:
+            return intent['answer']
 
     def start_scenario(self, scenario_name, user_id):
         """
@@ -141,11 +427,11 @@ class ChatBot:
         :param int user_id: id пользователя
         :return str: Строка сообщения собеседнику для отправки
         """
-        scenario = settings.SCENARIOS[scenario_name]
-        step_name = scenario['first_step']
-        self.dialogs[user_id].scenario_state = UserState(scenario_name=scenario_name, step_name=step_name)
-        return scenario['steps'][step_name]['context']
+        first_step = self.scenarios[scenario_name].first_step
+        self.dialogs[user_id].scenario_state = UserState(scenario_name=scenario_name, step_name=first_step.name)
+        return first_step.context
 
+    @timed(STAGE_LATENCY)
     def continue_scenario(self, text, user_id):
         """
         Продолжить сценарий (перейти на следующий шаг или завершить)
@@ -154,92 +440,129 @@ class ChatBot:
         :param int user_id: id пользователя
         :return str: Строка сообщения собеседнику для отправки
         """
-        state = self.dialogs[user_id].scenario_state
-        steps = settings.SCENARIOS[state.scenario_name]['steps']
-        step = steps[state.step_name]
-        if 'send_image' in step:
-            self.send_image_handle(user_id=user_id, step=step, context=state.context)
-        handler = getattr(handlers, step['handler'])
-        if handler(user_id=user_id, text=text, context=state.context):
-            next_step = steps[step['next_step']]
-            message_text = next_step['context'].format(**state.context)
-            if next_step['next_step']:
-                state.step_name = step['next_step']
-                self.dialogs[user_id].scenario_state = state
+        user = self.dialogs[user_id]
+        state = user.scenario_state
+        scenario = self.scenarios.get(state.scenario_name)
+        step = scenario.get_step(state.step_name) if scenario is not None else None
+        if step is None:
+            # Сценарий или шаг удален из описания после перезагрузки настроек
+            user.scenario_state = None
+            return self.find_intent(utterance=Utterance(text), user_id=user_id)
+        if step.send_image is not None:
+            self.send_image_handle(user_id=user_id, image_handler=step.send_image, context=state.context)
+        if step.handler(user_id=user_id, text=text, context=state.context):
+            next_step = step.next_step
+            message_text = next_step.context.format(**state.context)
+            if not next_step.is_final:
+                state.step_name = next_step.name
+                user.scenario_state = state
             else:
-                if next_step['handler']:
-                    handler = getattr(handlers, next_step['handler'])
-                    handler(user_id=user_id, text=text, context=state.context)
-                if 'send_image' in next_step:
-                    self.send_image_handle(user_id=user_id, step=next_step, context=state.context)
-                self.dialogs[user_id].scenario_state = None
+                if next_step.handler is not None:
+                    next_step.handler(user_id=user_id, text=text, context=state.context)
+                if next_step.send_image is not None:
+                    self.send_image_handle(user_id=user_id, image_handler=next_step.send_image,
+                                           context=state.context)
+                user.scenario_state = None
         else:
-            message_text = step['error_response'].format(**state.context)
+            message_text = step.error_response.format(**state.context)
         return message_text
 
-    def send_image_handle(self, user_id, step, context):
+    def send_image_handle(self, user_id, image_handler, context):
         """
-        Обработка шага, у которого есть атрибут отправки сообщения
+        Обработка шага, у которого есть атрибут отправки сообщения.
+        Обработчик шага готовит задание на отрисовку, картинка отправляется после фиксации
+        транзакции события (см. send_pending_images).
 
         :param int user_id: id пользователя-получателя
-        :param dict step: Словарь, содержащий текущий шаг сценария
+        :param callable image_handler: Обработчик шага, формирующий задание на отрисовку
         :param dict context: Контекст выполнения шага
         """
-        handler = getattr(handlers, step['send_image'])
-        image = handler(context=context)
-        self.send_image(image=image, user_id=user_id)
+        job = image_handler(context=context)
+        self.pending_images.setdefault(user_id, []).append(job)
+
+    def send_pending_images(self, user_id):
+        """
+        Отрисовать, загрузить в ВК и отправить картинки, подготовленные при обработке события.
+        Картинка рисуется в RenderService: ожидает результат только поток этого пользователя.
+        Если билет по такому же заданию уже загружался в ВК, повторно отправляется готовое вложение.
+
+        :param int user_id: id пользователя-получателя
+        """
+        for job in self.pending_images.pop(user_id, ()):
+            try:
+                attachment = self.uploader.get_attachment(job.fingerprint)
+                if attachment is None:
+                    image = self.renderer.render(job)
+                    attachment = self.uploader.upload(image=image, content_hash=job.fingerprint, lookup=False)
+            except Exception:
+                self.log.exception(Exception)
+                continue
+            self.send_message(user_id=user_id, attachment=attachment)
 
     def send_message(self, user_id, message_text=None, attachment=None):
         """
-        Функция отправки сообщения пользователю ВК
+        Функция отправки сообщения пользователю ВК.
+        Сообщение ставится в очередь VkOutbox, результат отправки записывается в лог.
 
         :param int user_id: id пользователя-получателя
         :param str message_text: текст сообщения
         :param str attachment: вложение в сообщение (картинка)
+        :return Future: Future с id отправленного сообщения
         """
         message_id = randint(1, 2 ** 64)
-        try:
-            self.api.messages.send(user_id=user_id, random_id=message_id, group_id=self.group_id,
-                                   message=message_text, attachment=attachment, v=self.__vk_api_version)
-            if message_text:
-                self.log.info(f'response to user {user_id}: {message_text}')
-            elif attachment:
-                self.log.info(f'response to user {user_id}: {attachment}')
-        except Exception:
-            self.log.exception(Exception)
+        future = self.outbox.call('messages.send', user_id=user_id, random_id=message_id, group_id=self.group_id,
+                                  message=message_text, attachment=attachment, v=self.__vk_api_version)
+        future.add_done_callback(lambda result: self.log_response(result=result, user_id=user_id,
+                                                                  response=message_text or attachment))
+        return future
+
+    def log_response(self, result, user_id, response):
+        """
+        Запись в лог результата отправки сообщения
+
+        :param Future result: Future отправки сообщения
+        :param int user_id: id пользователя-получателя
+        :param str response: Текст сообщения или вложение
+        """
+        if result.exception() is None:
+            self.log.info(f'response to user {user_id}: {response}')
+        else:
+            self.log.error(f'response to user {user_id} failed: {result.exception()}')
 
     def send_image(self, image, user_id):
         """
         Отправить картинку пользователю.
 
-        :param IOBytes image: Картинка для отправки
+        :param bytes image: Картинка для отправки (PNG)
         :param int user_id: id пользователя-получателя
         """
-        upload_url = self.api.photos.getMessagesUploadServer()['upload_url']
-        upload_data = requests.post(url=upload_url, files={'photo': ('image.png', image, 'image/png')}).json()
-        image_data = self.api.photos.saveMessagesPhoto(**upload_data)
-        owner_id = image_data[0]['owner_id']
-        media_id = image_data[0]['id']
-        attachment = f'photo{owner_id}_{media_id}'
+        attachment = self.uploader.upload(image=image)
         self.send_message(user_id=user_id, attachment=attachment)
 
-    @staticmethod
-    def dialog_to_db(user_id):
+    def dialog_to_db(self, user_id):
         """
-        Обновление данных о диалоге с пользователем в БД
+        Обновление данных о диалоге с пользователем в БД.
+        Запись выполняется пакетно в фоне (см. LastDialogWriter).
 
         :param int user_id: id пользователя
         """
-        try:
-            database_model.insert_dialog(user_id=user_id)
-        except DuplicateKeyError:
-            database_model.update_last_dialog(user_id=user_id)
+        self.dialog_writer.touch(user_id=user_id)
 
 
 if __name__ == '__main__':
     from local_settings import VK_ACCESS_TOKEN, VK_GROUP_ID
 
     bot = ChatBot(token=VK_ACCESS_TOKEN, group_id=VK_GROUP_ID)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: bot.reload_config())
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: PROFILER.toggle())
     print('Бот запущен...')
-    bot.run()
+    if '--sync' in sys.argv:
+        bot.run()
+    elif '--callback' in sys.argv:
+        from local_settings import VK_CALLBACK_CONFIRMATION, VK_CALLBACK_SECRET
+        bot.run_callback(confirmation_code=VK_CALLBACK_CONFIRMATION, secret=VK_CALLBACK_SECRET)
+    else:
+        bot.run_async()
     print('Работа завершена!')
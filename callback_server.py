@@ -0,0 +1,219 @@
+"""
+Прием событий через Callback API ВК вместо long poll.
+Легкий асинхронный HTTP-сервер отвечает на запрос подтверждения адреса, проверяет секретный
+ключ и сразу отвечает "ok", а событие передает в тот же конвейер обработки, что и long poll.
+Экземпляры бота можно запустить за балансировщиком нагрузки: повторы одного события
+(ВК повторяет событие, если не получил "ok") отбрасываются в пределах экземпляра, сессии
+пользователей читаются из БД для каждого события (см. ChatBot.run_callback). Порядок событий
+одного пользователя соблюдается в пределах экземпляра, поэтому балансировщик должен направлять
+события одного peer_id на один экземпляр.
+
+Проверка на записанных событиях (по одному JSON события в строке, как у benchmarks.loadtest --replay):
+    python callback_server.py events.jsonl --url http://127.0.0.1:8080/callback --secret SECRET --group-id 1
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+from collections import OrderedDict
+from urllib.request import Request, urlopen
+
+from vk_api.bot_longpoll import VkBotLongPoll
+
+from settings import (CALLBACK_DEDUP_SIZE, CALLBACK_HOST, CALLBACK_IDLE_TIMEOUT, CALLBACK_MAX_BODY, CALLBACK_PATH,
+                      CALLBACK_PORT)
+
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large'}
+
+
+def parse_event(raw):
+    """
+    Событие в том же виде, в каком его возвращает VkBotLongPoll
+
+    :param dict raw: Событие Callback API
+    :return VkBotEvent: Событие
+    """
+    event_class = VkBotLongPoll.CLASS_BY_EVENT_TYPE.get(raw['type'], VkBotLongPoll.DEFAULT_EVENT_CLASS)
+    return event_class(raw)
+
+
+class CallbackServer:
+    """
+    HTTP-сервер Callback API.
+    Экземпляр создается и запускается внутри работающего цикла событий asyncio,
+    on_event вызывается в потоке цикла и не должен блокировать его.
+    """
+
+    def __init__(self, on_event, group_id, confirmation_code, secret=None, host=CALLBACK_HOST, port=CALLBACK_PORT,
+                 path=CALLBACK_PATH, dedup_size=CALLBACK_DEDUP_SIZE):
+        """
+        :param callable on_event: Обработчик события, вызывается как on_event(raw) с телом запроса (dict)
+        :param int group_id: id сообщества ВК
+        :param str confirmation_code: Строка, которую нужно вернуть на запрос подтверждения адреса
+        :param str secret: Секретный ключ из настроек Callback API (None - не проверять)
+        :param str host: Адрес, на котором принимаются запросы
+        :param int port: Порт (0 - любой свободный)
+        :param str path: Путь, на который ВК отправляет события
+        :param int dedup_size: Число запоминаемых event_id для отбрасывания повторов
+        """
+        self.on_event = on_event
+        self.group_id = int(group_id)
+        self.confirmation_code = confirmation_code
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+        self.dedup_size = dedup_size
+        self.log = logging.getLogger('bot')
+        self._seen = OrderedDict()
+        self._server = None
+
+    async def start(self):
+        """ Запуск сервера """
+        self._server = await asyncio.start_server(self._serve_connection, host=self.host, port=self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.log.info(f'Callback API is served on {self.host}:{self.port}{self.path}')
+
+    async def stop(self):
+        """ Остановка сервера """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def handle_request(self, method, path, body):
+        """
+        Обработка запроса Callback API
+
+        :param str method: Метод HTTP
+        :param str path: Путь запроса
+        :param bytes body: Тело запроса
+        :return tuple: Код ответа HTTP и текст ответа
+        """
+        if path.split('?')[0] != self.path:
+            return 404, 'not found'
+        if method != 'POST':
+            return 405, 'method not allowed'
+        try:
+            raw = json.loads(body.decode('utf-8'))
+            event_type = raw['type']
+        except (ValueError, KeyError, TypeError):
+            return 400, 'bad request'
+        if raw.get('group_id') != self.group_id:
+            return 403, 'forbidden'
+        if event_type == 'confirmation':
+            return 200, self.confirmation_code
+        if self.secret is not None and not hmac.compare_digest(str(raw.get('secret', '')), self.secret):
+            self.log.warning(f'Callback API event with a wrong secret: {raw.get("event_id")}')
+            return 403, 'forbidden'
+        event_id = raw.get('event_id')
+        if event_id is not None:
+            if event_id in self._seen:
+                return 200, 'ok'
+            self._seen[event_id] = None
+            if len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+        try:
+            self.on_event(raw)
+        except Exception:
+            self.log.exception(Exception)
+        return 200, 'ok'
+
+    async def _serve_connection(self, reader, writer):
+        """ Обработка запросов одного соединения (с поддержкой keep-alive) """
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), timeout=CALLBACK_IDLE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                if body is None:
+                    status, text, keep_alive = 413, 'payload too large', False
+                else:
+                    status, text = self.handle_request(method=method, path=path, body=body)
+                payload = text.encode('utf-8')
+                writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                             f'Content-Type: text/plain; charset=utf-8\r\n'
+                             f'Content-Length: {len(payload)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1')
+                             + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """
+        Чтение запроса HTTP/1.1
+
+        :param asyncio.StreamReader reader: Поток соединения
+        :return tuple: Метод, путь, тело (None, если тело больше CALLBACK_MAX_BODY) и признак keep-alive
+                       или None, если соединение закрыто
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        method, path, version = request_line.decode('latin-1').split()
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        length = int(headers.get('content-length', 0))
+        if length > CALLBACK_MAX_BODY:
+            return method, path, None, False
+        body = await reader.readexactly(length) if length else b''
+        return method, path, body, keep_alive
+
+
+def post_events(path, url, group_id, secret=None):
+    """
+    Отправка записанных событий на сервер Callback API
+
+    :param str path: Файл с событиями (JSON в каждой строке)
+    :param str url: Адрес сервера Callback API
+    :param int group_id: id сообщества ВК
+    :param str secret: Секретный ключ
+    :return int: Число событий, на которые сервер ответил "ok"
+    """
+    acknowledged = 0
+    with open(path, encoding='UTF-8') as events_file:
+        for line in events_file:
+            if not line.strip():
+                continue
+            raw = json.loads(line)
+            raw['group_id'] = group_id
+            if secret is not None:
+                raw['secret'] = secret
+            request = Request(url, data=json.dumps(raw).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'})
+            with urlopen(request) as response:
+                acknowledged += response.read() == b'ok'
+    return acknowledged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Отправка записанных событий на сервер Callback API')
+    parser.add_argument('events', help='Файл записанных событий (JSON в каждой строке)')
+    parser.add_argument('--url', default=f'http://127.0.0.1:{CALLBACK_PORT}{CALLBACK_PATH}',
+                        help='Адрес сервера Callback API')
+    parser.add_argument('--group-id', type=int, required=True, help='id сообщества ВК')
+    parser.add_argument('--secret', help='Секретный ключ')
+    args = parser.parse_args()
+    acknowledged = post_events(path=args.events, url=args.url, group_id=args.group_id, secret=args.secret)
+    print(f'Событий принято: {acknowledged}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
-from datetime import datetime
+from datetime import date, datetime
 import peewee
-from database import DialogsTable, EventsTable, db_handler, EventVisitorsTable
+from database import DialogsTable, EventsTable, db_handler, EventVisitorsTable, PhotoAttachmentsTable
 from exceptions import DuplicateKeyError, NotNullValueError
+from metrics import DB_LATENCY, timed
 
 
+@timed(DB_LATENCY)
 def insert_dialog(user_id, user_name=None, name=None):
     """
     Создать новую запись диалога в БД
@@ -13,15 +15,16 @@ def insert_dialog(user_id, user_name=None, name=None):
     :param str name: Имя пользователя (как представился лично)
     """
     try:
-        DialogsTable.insert({'user_id': user_id, 'user_name': user_name, 'name': name}).execute()
+        with db_handler.atomic():
+            DialogsTable.insert({'user_id': user_id, 'user_name': user_name, 'name': name}).execute()
     except peewee.IntegrityError as exc:
-        db_handler.rollback()
         if 'duplicate key value violates' in exc.args[0]:
             raise DuplicateKeyError
         elif 'violates not-null constraint' in exc.args[0]:
             raise NotNullValueError
 
 
+@timed(DB_LATENCY)
 def update_dialog(user_id, **kwargs):
     """
     Обновить данные в таблице диалогов
@@ -35,6 +38,20 @@ def update_dialog(user_id, **kwargs):
         .execute()
 
 
+@timed(DB_LATENCY)
+def update_user_names(user_names):
+    """
+    Записать имена нескольких пользователей (со страницы) одним запросом
+
+    :param dict user_names: Словарь {id пользователя: имя пользователя}
+    """
+    DialogsTable \
+        .update(user_name=peewee.Case(DialogsTable.user_id, list(user_names.items()))) \
+        .where(DialogsTable.user_id.in_(list(user_names))) \
+        .execute()
+
+
+@timed(DB_LATENCY)
 def update_last_dialog(user_id):
     """
     Обновить время последнего диалога с пользователем в таблице
@@ -47,6 +64,23 @@ def update_last_dialog(user_id):
         .execute()
 
 
+@timed(DB_LATENCY)
+def upsert_last_dialogs(last_dialogs):
+    """
+    Записать время последнего диалога для нескольких пользователей одним запросом.
+    Отсутствующие в таблице пользователи добавляются.
+
+    :param dict last_dialogs: Словарь {id пользователя: время последнего диалога}
+    """
+    rows = [{'user_id': user_id, 'last_dialog': last_dialog} for user_id, last_dialog in last_dialogs.items()]
+    DialogsTable \
+        .insert_many(rows) \
+        .on_conflict(conflict_target=[DialogsTable.user_id],
+                     update={DialogsTable.last_dialog: peewee.EXCLUDED.last_dialog}) \
+        .execute()
+
+
+@timed(DB_LATENCY)
 def update_user_state(user_id, scenario_name, step_name, context):
     """
     Установить значения нахождения пользователя в сценарии
@@ -62,6 +96,7 @@ def update_user_state(user_id, scenario_name, step_name, context):
         .execute()
 
 
+@timed(DB_LATENCY)
 def clear_user_state(user_id):
     """
     Сбросить пользователя из состояния нахождения в сценарии
@@ -70,11 +105,12 @@ def clear_user_state(user_id):
     """
     DialogsTable \
         .update(scenario_state=None) \
-        .where(user_id == user_id) \
+        .where(DialogsTable.user_id == user_id) \
         .execute()
 
 
-def get_user_info(user_id):
+@timed(DB_LATENCY)
+def get_user_info(user_id, create=False):
     """
     Получить информацию о пользователе из БД для инициализации экземпляра класса VkUser.
     возвращается словарь вида:
@@ -84,6 +120,7 @@ def get_user_info(user_id):
        'scenario_state': user.scenario_state}
 
     :param int user_id: id пользователя
+    :param bool create: Создать запись диалога, если пользователя нет в БД
     :return dict:
     """
     result = {'user_name': None,
@@ -92,30 +129,35 @@ def get_user_info(user_id):
               'scenario_state': None}
     user = DialogsTable \
         .select(DialogsTable.user_name, DialogsTable.name, DialogsTable.email, DialogsTable.scenario_state) \
-        .where(DialogsTable.user_id == user_id)
-    if user.count():
-        user = user.first()
+        .where(DialogsTable.user_id == user_id) \
+        .first()
+    if user is not None:
         result = {'user_name': user.user_name,
                   'name': user.name,
                   'email': user.email,
                   'scenario_state': user.scenario_state}
+    elif create:
+        try:
+            insert_dialog(user_id=user_id)
+        except DuplicateKeyError:
+            pass
     return result
 
 
-def get_closest_event():
+@timed(DB_LATENCY)
+def get_upcoming_events():
     """
-    Получить ближайшее мероприятие из БД
+    Получить предстоящие мероприятия (начиная с сегодняшнего дня) в порядке их проведения
 
-    :return EventsTable: Строка результата поиска
+    :return list: Список строк EventsTable
     """
-    event = EventsTable\
-        .select()\
-        .where(EventsTable.date >= datetime.now())\
-        .order_by(EventsTable.date)\
-        .limit(1)
-    return event.first()
+    return list(EventsTable
+                .select()
+                .where(EventsTable.date >= date.today())
+                .order_by(EventsTable.date))
 
 
+@timed(DB_LATENCY)
 def event_registration(user_id, event_id):
     """
     Регистрация (и запись в базу) пользователя на событие
@@ -124,15 +166,44 @@ def event_registration(user_id, event_id):
     :param int event_id: id события
     """
     try:
-        EventVisitorsTable.insert({'user_id': user_id, 'event_id': event_id}).execute()
+        with db_handler.atomic():
+            EventVisitorsTable.insert({'user_id': user_id, 'event_id': event_id}).execute()
     except peewee.IntegrityError as exc:
-        db_handler.rollback()
         if 'duplicate key value violates' in exc.args[0]:
             raise DuplicateKeyError
         elif 'violates not-null constraint' in exc.args[0]:
             raise NotNullValueError
 
 
+@timed(DB_LATENCY)
+def get_photo_attachment(content_hash):
+    """
+    Получить ранее загруженное в ВК вложение по хэшу картинки
+
+    :param str content_hash: Хэш содержимого картинки
+    :return str: Вложение вида photo{owner_id}_{media_id} или None
+    """
+    photo = PhotoAttachmentsTable \
+        .select(PhotoAttachmentsTable.attachment) \
+        .where(PhotoAttachmentsTable.content_hash == content_hash) \
+        .first()
+    return photo.attachment if photo is not None else None
+
+
+@timed(DB_LATENCY)
+def save_photo_attachment(content_hash, attachment):
+    """
+    Сохранить загруженное в ВК вложение
+
+    :param str content_hash: Хэш содержимого картинки
+    :param str attachment: Вложение вида photo{owner_id}_{media_id}
+    """
+    PhotoAttachmentsTable \
+        .insert({'content_hash': content_hash, 'attachment': attachment}) \
+        .on_conflict_ignore() \
+        .execute()
+
+
 if __name__ == '__main__':
     # user_id = 8023886
     # update_user_state(user_id=8023886, scenario_name='registration', step_name='step1')
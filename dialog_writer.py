@@ -0,0 +1,75 @@
+import logging
+import threading
+from datetime import datetime
+
+import database_model
+from database import unit_of_work
+
+
+class LastDialogWriter:
+    """
+    Отложенная пакетная запись времени последнего диалога.
+    Отметки копятся в памяти и сбрасываются в БД одним запросом по таймеру или
+    при накоплении заданного числа пользователей.
+    """
+
+    def __init__(self, flush_interval, flush_size):
+        """
+        :param float flush_interval: Интервал сброса отметок в БД в секундах
+        :param int flush_size: Число отметок, при котором сброс выполняется досрочно
+        """
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.log = logging.getLogger('bot')
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Запуск фонового потока сброса """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='last-dialog-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Остановка фонового потока со сбросом накопленных отметок """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def touch(self, user_id):
+        """
+        Отметить диалог с пользователем
+
+        :param int user_id: id пользователя
+        """
+        with self._lock:
+            self._pending[user_id] = datetime.now()
+            if len(self._pending) >= self.flush_size:
+                self._wakeup.set()
+
+    def flush(self):
+        """ Записать накопленные отметки в БД """
+        with self._lock:
+            pending, self._pending = self._pending, dict()
+        if not pending:
+            return
+        try:
+            with unit_of_work():
+                database_model.upsert_last_dialogs(last_dialogs=pending)
+        except Exception:
+            self.log.exception(Exception)
+            with self._lock:
+                for user_id, last_dialog in pending.items():
+                    self._pending.setdefault(user_id, last_dialog)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
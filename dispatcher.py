@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from collections import deque
+
+
+class OrderedDispatcher:
+    """
+    Диспетчер событий для асинхронного режима работы бота.
+    События одного пользователя обрабатываются строго по очереди, события разных
+    пользователей - параллельно, но не более max_in_flight одновременно.
+    Экземпляр создается внутри работающего цикла событий asyncio.
+    """
+
+    def __init__(self, handler, max_in_flight, executor=None):
+        """
+        :param callable handler: Синхронный обработчик события, вызывается как handler(*args)
+        :param int max_in_flight: Максимальное число одновременно обрабатываемых событий
+        :param concurrent.futures.Executor executor: Пул, в котором выполняется обработчик
+        """
+        self.handler = handler
+        self.executor = executor
+        self.log = logging.getLogger('bot')
+        self._loop = asyncio.get_event_loop()
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._queues = dict()
+        self._workers = set()
+
+    @property
+    def pending(self):
+        """ Число событий, ожидающих обработки """
+        return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, key, *args):
+        """
+        Поставить событие в очередь пользователя
+
+        :param key: Ключ очереди (id пользователя)
+        :param args: Аргументы для вызова обработчика
+        """
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            worker = self._loop.create_task(self._worker(key=key, queue=queue))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        queue.append(args)
+
+    async def _worker(self, key, queue):
+        """ Последовательная обработка очереди одного пользователя """
+        try:
+            while queue:
+                args = queue.popleft()
+                async with self._semaphore:
+                    try:
+                        await self._loop.run_in_executor(self.executor, self.handler, *args)
+                    except Exception:
+                        self.log.exception(Exception)
+        finally:
+            del self._queues[key]
+
+    async def join(self):
+        """ Дождаться обработки всех поставленных в очередь событий """
+        while self._workers:
+            await asyncio.gather(*self._workers)
@@ -0,0 +1,104 @@
+import logging
+import select
+import threading
+import time
+from datetime import date
+
+import database_model
+from database import EVENTS_CHANNEL, is_postgres, open_raw_connection
+from settings import EVENTS_CACHE_TTL
+
+LISTEN_POLL_INTERVAL = 5
+LISTEN_RECONNECT_DELAY = 5
+
+
+class UpcomingEventsCache:
+    """
+    Кэш предстоящих мероприятий.
+    Список перечитывается из БД по истечении ttl, а также сразу после изменения таблицы
+    events (уведомление NOTIFY от триггера). Прошедшие мероприятия отбрасываются при каждом
+    обращении, поэтому смена дня в полночь не требует перечитывания.
+    """
+
+    def __init__(self, ttl, loader=database_model.get_upcoming_events):
+        """
+        :param float ttl: Время жизни списка мероприятий в секундах
+        :param callable loader: Функция загрузки предстоящих мероприятий, отсортированных по дате
+        """
+        self.ttl = ttl
+        self.loader = loader
+        self.log = logging.getLogger('bot')
+        self._events = None
+        self._expires = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def get_closest_event(self):
+        """
+        Получить ближайшее мероприятие
+
+        :return EventsTable: Строка мероприятия или None
+        """
+        today = date.today()
+        for event in self.get_events():
+            if event.date >= today:
+                return event
+        return None
+
+    def get_events(self):
+        """
+        Получить список предстоящих мероприятий (может содержать уже прошедшие)
+
+        :return list: Список строк EventsTable
+        """
+        with self._lock:
+            if self._events is None or time.monotonic() >= self._expires:
+                self._events = self.loader()
+                self._expires = time.monotonic() + self.ttl
+            return self._events
+
+    def invalidate(self):
+        """ Сбросить список мероприятий """
+        with self._lock:
+            self._events = None
+
+    def start_listening(self):
+        """ Запуск фонового потока, ожидающего уведомлений об изменении мероприятий (только PostgreSQL) """
+        if not is_postgres():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, name='events-listener', daemon=True)
+        self._thread.start()
+
+    def stop_listening(self):
+        """ Остановка фонового потока """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = open_raw_connection()
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {EVENTS_CHANNEL};')
+                self.invalidate()
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], LISTEN_POLL_INTERVAL) == ([], [], []):
+                        continue
+                    connection.poll()
+                    if connection.notifies:
+                        connection.notifies.clear()
+                        self.invalidate()
+            except Exception:
+                self.log.exception(Exception)
+                self._stopped.wait(timeout=LISTEN_RECONNECT_DELAY)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+upcoming_events = UpcomingEventsCache(ttl=EVENTS_CACHE_TTL)
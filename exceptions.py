@@ -11,3 +11,25 @@ class NotNullValueError(peewee.IntegrityError):
 
 class UserStateError(Exception):
     pass
+
+
+class RenderQueueFullError(Exception):
+    pass
+
+
+class PhotoUploadError(Exception):
+    """ Сервер загрузки ВК не принял картинку """
+    pass
+
+
+class ScenarioConfigError(Exception):
+    """ Ошибка в описании сценариев или намерений """
+    pass
+
+
+class VkCallError(Exception):
+    """ Ошибка отдельного вызова внутри запроса execute """
+    def __init__(self, error):
+        super().__init__(error.get('error_msg'))
+        self.code = error.get('error_code')
+        self.error = error
@@ -0,0 +1,138 @@
+"""
+Локальная имитация API ВК для тестов и нагрузочных прогонов.
+Поддерживает методы, которыми пользуется бот, и запрос execute в том виде,
+в каком его формирует VkOutbox.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+from vk_api.exceptions import ApiError, TOO_MANY_RPS_CODE
+from vk_api.vk_api import VkApiMethod
+
+
+class FakeResponse:
+    """ Ответ HTTP-запроса """
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeHttp:
+    """ HTTP-сессия: принимает загрузку картинок """
+
+    def __init__(self):
+        self.uploads = 0
+
+    def post(self, url, files=None, **kwargs):
+        self.uploads += 1
+        return FakeResponse({'server': 1, 'photo': '[{"photo": "fake"}]', 'hash': 'fake'})
+
+
+class FakeVk:
+    """
+    Имитация сессии VkApi (метод method) с ограничением частоты запросов.
+    Отправленные сообщения сохраняются в messages.
+    """
+
+    def __init__(self, rate_limit=None, latency=0.0, on_message=None):
+        """
+        :param int rate_limit: Максимальное число запросов в секунду, сверх него - ошибка 6
+        :param float latency: Задержка ответа на запрос в секундах
+        :param callable on_message: Вызывается для каждого отправленного сообщения: on_message(values)
+        """
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.on_message = on_message
+        self.http = FakeHttp()
+        self.RPS_DELAY = 0
+        self.requests = []
+        self.messages = []
+        self.call_errors = deque()
+        self._request_times = deque()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get_api(self):
+        return VkApiMethod(self)
+
+    def method(self, method, values=None, raw=False):
+        """
+        Вызов метода API
+
+        :param str method: Метод API
+        :param dict values: Параметры
+        :param bool raw: Вернуть ответ целиком (для execute)
+        """
+        values = dict(values or {})
+        with self._lock:
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] >= 1:
+                self._request_times.popleft()
+            self._request_times.append(now)
+            self.requests.append(method)
+            limited = self.rate_limit is not None and len(self._request_times) > self.rate_limit
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            error = {'error_code': TOO_MANY_RPS_CODE, 'error_msg': 'Too many requests per second'}
+            raise ApiError(self, method, values, raw, error)
+        if method == 'execute':
+            response = {'response': [], 'execute_errors': []}
+            for call_method, call_values in self.parse_execute(values['code']):
+                try:
+                    response['response'].append(self.call(method=call_method, values=call_values))
+                except ApiError as exc:
+                    response['response'].append(False)
+                    response['execute_errors'].append(dict(exc.error, method=call_method))
+            return response if raw else response['response']
+        result = self.call(method=method, values=values)
+        return {'response': result} if raw else result
+
+    def call(self, method, values):
+        """ Выполнение отдельного метода """
+        with self._lock:
+            error_code = self.call_errors.popleft() if self.call_errors else None
+        if error_code is not None:
+            raise ApiError(self, method, values, False, {'error_code': error_code, 'error_msg': 'Fake error'})
+        if method == 'messages.send':
+            with self._lock:
+                self.messages.append(values)
+            if self.on_message is not None:
+                self.on_message(values)
+            return next(self._ids)
+        if method == 'users.get':
+            return [{'id': int(user_id), 'first_name': 'Имя', 'last_name': f'Фамилия{user_id}'}
+                    for user_id in str(values['user_ids']).split(',')]
+        if method == 'photos.getMessagesUploadServer':
+            return {'upload_url': 'http://localhost/upload'}
+        if method == 'photos.saveMessagesPhoto':
+            return [{'owner_id': -1, 'id': next(self._ids)}]
+        return 1
+
+    @staticmethod
+    def parse_execute(code):
+        """
+        Разбор кода execute вида "return [API.method({...}),...];"
+
+        :param str code: Код запроса execute
+        :return list: Список пар (метод, параметры)
+        """
+        decoder = json.JSONDecoder()
+        body = code.strip()[len('return ['):-len('];')]
+        calls = []
+        position = 0
+        while position < len(body):
+            start = body.index('API.', position) + len('API.')
+            bracket = body.index('(', start)
+            values, end = decoder.raw_decode(body, bracket + 1)
+            calls.append((body[start:bracket], values))
+            position = end + 1
+            if position < len(body) and body[position] == ',':
+                position += 1
+        return calls
@@ -1,24 +1,25 @@
 import re
 from datetime import datetime
-from database_model import get_closest_event, get_user_info, event_registration
+from database_model import event_registration
 from database_model import DuplicateKeyError
+from event_cache import upcoming_events
 from settings import RE_NAME, RE_EMAIL, DEFAULT_DATE_FORMAT, NO_EVENTS_ANSWER
-from ticket_maker import TicketMaker
+from ticket_maker import TicketJob
 
 
 def handle_hello(**kwargs):
-    """ Обработка приветствия и формирование ответа с обращением по имени, если такое есть в базе """
-    info = get_user_info(user_id=kwargs['user_id'])
+    """ Обработка приветствия и формирование ответа с обращением по имени, если оно известно """
+    name = kwargs['user'].name
     message_text = 'Привет!'
-    if info['name']:
-        message_text = 'Привет, {}!'.format(info['name'])
+    if name:
+        message_text = 'Привет, {}!'.format(name)
     return message_text
 
 
 def handle_polite_hello(**kwargs):
-    """ Обработка вежливого приветствия и формирование ответа с обращением по имени, если такое есть в базе """
+    """ Обработка вежливого приветствия и формирование ответа с обращением по имени, если оно известно """
     hr = datetime.now().hour
-    info = get_user_info(user_id=kwargs['user_id'])
+    name = kwargs['user'].name
     if 0 <= hr < 6:
         greeting = 'Доброй ночи'
     elif 6 <= hr < 12:
@@ -27,8 +28,8 @@ def handle_polite_hello(**kwargs):
         greeting = 'Добрый день'
     else:
         greeting = 'Добрый вечер'
-    if info['name']:
-        return '{}, {}!'.format(greeting, info['name'])
+    if name:
+        return '{}, {}!'.format(greeting, name)
     return f'{greeting}!'
 
 
@@ -52,7 +53,7 @@ def handle_email(**kwargs):
 
 def handle_closest_event_date(**kwargs):
     """ Получение названия и даты ближайшего мероприятия """
-    event = get_closest_event()
+    event = upcoming_events.get_closest_event()
     if event is not None:
         return f'{event.title} состоится {event.date.strftime(DEFAULT_DATE_FORMAT)}'
     else:
@@ -61,7 +62,7 @@ def handle_closest_event_date(**kwargs):
 
 def handle_closest_event_location(**kwargs):
     """ Получение места проведения ближайшего мероприятия """
-    event = get_closest_event()
+    event = upcoming_events.get_closest_event()
     if event is not None:
         return f'{event.title} состоится в {event.location}.\r\n{event.map_point}'
     else:
@@ -70,7 +71,7 @@ def handle_closest_event_location(**kwargs):
 
 def handle_save_data_to_db(**kwargs):
     """ Сохранение регистрации на мероприятие в БД """
-    event = get_closest_event()
+    event = upcoming_events.get_closest_event()
     if event is not None:
         try:
             event_registration(user_id=kwargs['user_id'], event_id=event.event_id)
@@ -80,18 +81,17 @@ def handle_save_data_to_db(**kwargs):
 
 def generate_ticket(**kwargs):
     """
-    Генерация билета на мероприятие
-    
-    :return IOBytes: файл билета
+    Подготовка задания на генерацию билета на мероприятие.
+    Сама отрисовка выполняется в RenderService.
+
+    :return TicketJob: задание на отрисовку билета
     """
-    event = get_closest_event()
-    ticket = TicketMaker()
-    ticket.write_title(title=event.title)
-    ticket.write_name(name=kwargs['context']['name'])
-    ticket.write_location(location=f'{event.date.strftime(DEFAULT_DATE_FORMAT)}, {event.location}')
-    ticket.write_note(note=event.note)
-    ticket.draw_avatar(kwargs['context']['email'])
-    return ticket.image_io
+    event = upcoming_events.get_closest_event()
+    return TicketJob(title=event.title,
+                     location=f'{event.date.strftime(DEFAULT_DATE_FORMAT)}, {event.location}',
+                     note=event.note,
+                     name=kwargs['context']['name'],
+                     email=kwargs['context']['email'])
 
 
 if __name__ == '__main__':
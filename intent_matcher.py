@@ -0,0 +1,329 @@
+import difflib
+import re
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+
+from settings import RE_MULTIPLE_SPACES
+
+RE_WORD = re.compile(r'(\w+)')
+ROUTER_FLAGS = {re.IGNORECASE: 'i', re.MULTILINE: 'm', re.DOTALL: 's', re.ASCII: 'a'}
+RE_GROUP_REFERENCE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+NOT_CLASSIFIED = object()
+DECISION_CACHE_SIZE = 1024
+
+
+def tokenize(text):
+    """
+    Разбить сообщение на уникальные слова в нижнем регистре
+
+    :param str text: Сообщение пользователя
+    :return list: Список слов
+    """
+    return list(dict.fromkeys(word.lower() for word in RE_WORD.findall(text)))
+
+
+class Utterance:
+    """
+    Сообщение пользователя, подготовленное к поиску намерения: текст без лишних пробелов
+    и слова в нижнем регистре. Создается один раз на сообщение.
+    """
+    __slots__ = ('text', 'words')
+
+    def __init__(self, text):
+        """
+        :param str text: Текст сообщения
+        """
+        self.text = RE_MULTIPLE_SPACES.sub(' ', text.strip())
+        self.words = tokenize(self.text)
+
+    def __repr__(self):
+        return f'Utterance({self.text!r})'
+
+
+class DecisionCache:
+    """ Кэш решений: нормализованный текст сообщения -> номер намерения (вытесняются давно не использовавшиеся) """
+    MISSING = object()
+
+    def __init__(self, maxsize):
+        """
+        :param int maxsize: Максимальное число записей
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, text):
+        """
+        Получить решение
+
+        :param str text: Нормализованный текст сообщения
+        :return: Номер намерения, None (намерение не найдено) или DecisionCache.MISSING
+        """
+        with self._lock:
+            index = self._data.get(text, self.MISSING)
+            if index is self.MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(text)
+            return index
+
+    def put(self, text, index):
+        """
+        Запомнить решение
+
+        :param str text: Нормализованный текст сообщения
+        :param int index: Номер намерения или None
+        """
+        with self._lock:
+            self._data[text] = index
+            self._data.move_to_end(text)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """ Сбросить решения и счетчики """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """ Доля обращений, найденных в кэше """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def stats(self):
+        """ Показатели работы кэша """
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate}
+
+
+def compile_router(patterns):
+    """
+    Объединение регулярных выражений в одно выражение-альтернативу с именованной группой
+    на каждую ветку: за один вызов search находится самое левое совпадение среди всех выражений.
+    Общие начала веток sre выносит за альтернативу, поэтому выражения с общим началом
+    (например, "добр(ое|ый) ...") проверяются за один проход.
+
+    :param list patterns: Список пар (имя ветки, скомпилированное выражение)
+    :return re.Pattern: Объединенное выражение или None, если выражения нельзя объединить
+                        (ссылки на группы, именованные группы, флаги без встроенной формы)
+    """
+    if not patterns:
+        return None
+    all_flags = {pattern.flags & ~re.UNICODE for _, pattern in patterns}
+    common_flags = all_flags.pop() if len(all_flags) == 1 else 0
+    branches = []
+    for name, pattern in patterns:
+        flags = pattern.flags & ~re.UNICODE
+        if pattern.groupindex or flags & ~sum(ROUTER_FLAGS) or RE_GROUP_REFERENCE.search(pattern.pattern):
+            return None
+        inline_flags = ''.join(letter for flag, letter in ROUTER_FLAGS.items() if flags & ~common_flags & flag)
+        branches.append(f'(?{inline_flags}:{pattern.pattern})(?P<{name}>)')
+    try:
+        return re.compile('|'.join(branches), flags=common_flags)
+    except re.error:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def similarity(standard, pattern):
+    """
+    Коэффициент схожести слов (как в ChatBot.words_matcher)
+
+    :param str standard: Эталонное слово в нижнем регистре
+    :param str pattern: Проверяемое слово в нижнем регистре
+    :return float: Коэффициент схожести от 0 до 1
+    """
+    return difflib.SequenceMatcher(None, standard, pattern).ratio()
+
+
+class IntentMatcher:
+    """
+    Поиск намерения пользователя по настройкам INTENTS.
+    Ключевые слова индексируются один раз при создании: по символьному индексу для слова
+    сообщения сразу для всех ключевых слов вычисляется верхняя граница схожести (та же, что
+    у difflib.SequenceMatcher.quick_ratio). Точное сравнение выполняется только для ключевых
+    слов, у которых граница не ниже min_ratio, поэтому результат совпадает с words_matcher.
+    """
+
+    def __init__(self, intents, cache_size=4096, decision_cache_size=DECISION_CACHE_SIZE):
+        """
+        :param list intents: Список намерений в формате settings.INTENTS
+        :param int cache_size: Число слов, для которых запоминаются границы схожести
+        :param int decision_cache_size: Число сообщений, для которых запоминается найденное намерение
+        """
+        self.intents = intents
+        self.decisions = DecisionCache(maxsize=decision_cache_size)
+        self._keywords = []
+        self._intent_keywords = []
+        self._char_index = defaultdict(list)
+        keyword_ids = dict()
+        for intent in intents:
+            if intent['tokens'] is None:
+                self._intent_keywords.append(None)
+                continue
+            ids = []
+            for token in intent['tokens']:
+                keyword = token.lower()
+                if keyword not in keyword_ids:
+                    keyword_ids[keyword] = len(self._keywords)
+                    self._keywords.append(keyword)
+                    for char, count in Counter(keyword).items():
+                        self._char_index[char].append((keyword_ids[keyword], count))
+                ids.append(keyword_ids[keyword])
+            self._intent_keywords.append(ids)
+        self._common_chars = lru_cache(maxsize=cache_size)(self._count_common_chars)
+        self._token_indexes = [index for index, intent in enumerate(intents) if intent['tokens'] is not None]
+        self._re_indexes = [index for index, intent in enumerate(intents)
+                            if intent['tokens'] is None and intent['re_token'] is not None]
+        self._re_tokens = {index: re.compile(intents[index]['re_token']) for index in self._re_indexes}
+        self._router = compile_router([(f'intent{index}', self._re_tokens[index]) for index in self._re_indexes])
+
+    def _count_common_chars(self, word):
+        """
+        Число общих символов слова с каждым ключевым словом (с учетом повторов)
+
+        :param str word: Слово в нижнем регистре
+        :return dict: Словарь {номер ключевого слова: число общих символов}
+        """
+        common = defaultdict(int)
+        for char, count in Counter(word).items():
+            for keyword_id, keyword_count in self._char_index.get(char, ()):
+                common[keyword_id] += min(count, keyword_count)
+        return common
+
+    def is_words_matched(self, intent_index, words, matched=None):
+        """
+        Проверка слов сообщения на схожесть с ключевыми словами намерения
+
+        :param int intent_index: Номер намерения в списке
+        :param list words: Слова сообщения в нижнем регистре
+        :param dict matched: Результаты проверки отдельных слов {(номер намерения, слово): bool},
+                             общие для пакета сообщений (см. find_indexes)
+        :return bool:
+        """
+        if matched is None:
+            for word in words:
+                if self._is_word_matched(intent_index, word):
+                    return True
+            return False
+        for word in words:
+            key = (intent_index, word)
+            if key not in matched:
+                matched[key] = self._is_word_matched(intent_index, word)
+            if matched[key]:
+                return True
+        return False
+
+    def _is_word_matched(self, intent_index, word):
+        """ Проверка одного слова на схожесть с ключевыми словами намерения """
+        min_ratio = self.intents[intent_index]['min_ratio']
+        common_chars = self._common_chars(word)
+        for keyword_id in self._intent_keywords[intent_index]:
+            keyword = self._keywords[keyword_id]
+            upper_bound = 2.0 * common_chars.get(keyword_id, 0) / (len(keyword) + len(word))
+            if upper_bound >= min_ratio and similarity(keyword, word) >= min_ratio:
+                return True
+        return False
+
+    def find_re_index(self, text):
+        """
+        Найти номер первого намерения с регулярным выражением, которое есть в тексте.
+        Объединенное выражение за один проход отвечает, есть ли в тексте хоть одно выражение;
+        при совпадении отдельно проверяются только намерения с большим приоритетом, чем найденное.
+
+        :param str text: Сообщение пользователя
+        :return int: Номер намерения или None
+        """
+        if self._router is not None:
+            match = self._router.search(text)
+            if match is None:
+                return None
+            found = int(match.lastgroup[len('intent'):])
+        else:
+            found = None
+        for index in self._re_indexes:
+            if found is not None and index >= found:
+                break
+            if self._re_tokens[index].search(text):
+                return index
+        return found
+
+    def find_index(self, text, matched=None, words=None):
+        """
+        Найти номер первого подходящего намерения
+
+        :param str text: Сообщение пользователя
+        :param dict matched: Результаты проверки слов, общие для пакета сообщений
+        :param list words: Слова сообщения в нижнем регистре, если уже получены (Utterance.words)
+        :return int: Номер намерения или None
+        """
+        re_index = self.find_re_index(text=text)
+        for index in self._token_indexes:
+            if re_index is not None and index > re_index:
+                break
+            if words is None:
+                words = tokenize(text)
+            if self.is_words_matched(intent_index=index, words=words, matched=matched):
+                return index
+        return re_index
+
+    def decide(self, utterance, matched=None):
+        """
+        Номер намерения для сообщения с учетом кэша решений
+
+        :param Utterance utterance: Сообщение пользователя
+        :param dict matched: Результаты проверки слов, общие для пакета сообщений
+        :return int: Номер намерения или None
+        """
+        index = self.decisions.get(utterance.text)
+        if index is DecisionCache.MISSING:
+            index = self.find_index(text=utterance.text, matched=matched, words=utterance.words)
+            self.decisions.put(utterance.text, index)
+        return index
+
+    def find_indexes(self, texts):
+        """
+        Найти номера намерений для пакета сообщений.
+        Одинаковые сообщения и одинаковые слова разных сообщений проверяются один раз.
+
+        :param list texts: Сообщения пользователей (str или Utterance)
+        :return list: Номера намерений (или None) в порядке сообщений
+        """
+        matched = dict()
+        indexes = dict()
+        result = []
+        for text in texts:
+            utterance = text if isinstance(text, Utterance) else Utterance(text)
+            if utterance.text not in indexes:
+                indexes[utterance.text] = self.decide(utterance=utterance, matched=matched)
+            result.append(indexes[utterance.text])
+        return result
+
+    def match(self, text):
+        """
+        Найти первое подходящее намерение
+
+        :param text: Сообщение пользователя (str или Utterance)
+        :return dict: Намерение из списка или None
+        """
+        index = self.decide(utterance=text if isinstance(text, Utterance) else Utterance(text))
+        return self.intents[index] if index is not None else None
+
+    def match_batch(self, texts):
+        """
+        Найти первые подходящие намерения для пакета сообщений
+
+        :param list texts: Сообщения пользователей (str или Utterance)
+        :return list: Намерения из списка (или None) в порядке сообщений
+        """
+        return [self.intents[index] if index is not None else None for index in self.find_indexes(texts=texts)]
@@ -1,4 +1,4 @@
-from settings import WORK_DIR
+from settings import WORK_DIR, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE
 
 CONFIG = {
         'version': 1,
@@ -10,10 +10,13 @@ CONFIG = {
         },
         'handlers': {
             'log_handler': {
-                'class': 'logging.FileHandler',
+                '()': 'log_handlers.queued_file_handler',
                 'formatter': 'bot_log',
                 'filename': str(WORK_DIR / 'bot.log'),
-                'encoding': 'UTF-8'
+                'encoding': 'UTF-8',
+                'max_bytes': LOG_MAX_BYTES,
+                'backup_count': LOG_BACKUP_COUNT,
+                'queue_size': LOG_QUEUE_SIZE
             },
             'crash_handler': {
                 'class': 'logging.FileHandler',
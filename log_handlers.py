@@ -0,0 +1,108 @@
+import gzip
+import logging
+import os
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+def gzip_namer(name):
+    """ Имя сжатого архива лога """
+    return name + '.gz'
+
+
+def gzip_rotator(source, dest):
+    """
+    Сжать файл лога при ротации
+
+    :param str source: Имя файла лога
+    :param str dest: Имя архива
+    """
+    with open(source, 'rb') as source_file, gzip.open(dest, 'wb') as dest_file:
+        shutil.copyfileobj(source_file, dest_file)
+    os.remove(source)
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+    """ Ротация лога по размеру со сжатием старых файлов """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = gzip_namer
+        self.rotator = gzip_rotator
+
+
+class GzipTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """ Ротация лога по времени со сжатием старых файлов """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = gzip_namer
+        self.rotator = gzip_rotator
+
+
+class LogListener(QueueListener):
+    """ Фоновый поток записи записей лога из очереди """
+
+    def enqueue_sentinel(self):
+        # При заполненной очереди put_nowait потерял бы признак остановки
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Передача записей лога фоновому потоку записи (LogListener).
+    Вызывающий поток не ждет записи на диск. При заполненной очереди записи уровня
+    DEBUG отбрасываются, записи остальных уровней ожидают места в очереди.
+    """
+
+    def __init__(self, log_queue, listener=None):
+        """
+        :param queue.Queue log_queue: Очередь записей
+        :param LogListener listener: Поток записи, останавливается при закрытии обработчика
+        """
+        super().__init__(log_queue)
+        self.listener = listener
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno <= logging.DEBUG:
+                self.dropped += 1
+                return
+            self.queue.put(record)
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+        super().close()
+
+
+def queued_file_handler(filename, encoding=None, max_bytes=0, backup_count=0, when=None, queue_size=0):
+    """
+    Обработчик лога с записью в файл в фоновом потоке.
+    Используется в log_config.CONFIG как фабрика обработчика ('()').
+
+    :param str filename: Имя файла лога
+    :param str encoding: Кодировка файла
+    :param int max_bytes: Размер файла, при котором выполняется ротация (0 - без ротации по размеру)
+    :param int backup_count: Число хранимых архивов
+    :param str when: Интервал ротации по времени ('midnight', 'H', ...). Если задан, max_bytes не учитывается.
+    :param int queue_size: Размер очереди записей (0 - без ограничения)
+    :return NonBlockingQueueHandler: Обработчик лога
+    """
+    if when is not None:
+        file_handler = GzipTimedRotatingFileHandler(filename, when=when, backupCount=backup_count, encoding=encoding)
+    else:
+        file_handler = GzipRotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                               encoding=encoding)
+    log_queue = queue.Queue(maxsize=queue_size)
+    listener = LogListener(log_queue, file_handler)
+    handler = NonBlockingQueueHandler(log_queue, listener=listener)
+    listener.start()
+    return handler
@@ -0,0 +1,319 @@
+"""
+Метрики работы бота в текстовом формате Prometheus.
+Сбор включается переменной окружения BOT_METRICS=1, метрики отдаются по адресу
+http://METRICS_HOST:METRICS_PORT/metrics. При выключенном сборе декоратор timed
+возвращает функцию без изменений и не добавляет накладных расходов.
+"""
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from settings import METRICS_ENABLED, METRICS_HOST, METRICS_PORT
+
+ENABLED = METRICS_ENABLED
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_labels(label_names, label_values, **extra):
+    """
+    Строка меток вида {name="value",...}
+
+    :param tuple label_names: Имена меток
+    :param tuple label_values: Значения меток
+    :param extra: Дополнительные метки (например, le для гистограмм)
+    :return str: Строка меток или пустая строка
+    """
+    pairs = list(zip(label_names, label_values)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"')
+                                                 .replace('\n', r'\n'))
+                          for name, value in pairs) + '}'
+
+
+def format_value(value):
+    """ Значение метрики в формате Prometheus """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """ Счетчик событий """
+
+    def __init__(self, name, documentation, label_names=()):
+        """
+        :param str name: Имя метрики
+        :param str documentation: Описание метрики
+        :param tuple label_names: Имена меток
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """
+        Увеличить счетчик
+
+        :param label_values: Значения меток
+        :param float amount: Величина увеличения
+        """
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values):
+        """ Текущее значение счетчика """
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def collect(self):
+        """
+        Строки метрики в текстовом формате Prometheus
+
+        :return list: Список строк
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append('{}{} {}'.format(self.name, format_labels(self.label_names, label_values),
+                                              format_value(value)))
+        return lines
+
+
+class Histogram:
+    """ Гистограмма значений (длительностей) """
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param str name: Имя метрики
+        :param str documentation: Описание метрики
+        :param tuple label_names: Имена меток
+        :param tuple buckets: Верхние границы корзин по возрастанию (+Inf добавляется автоматически)
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """
+        Записать значение
+
+        :param float value: Значение
+        :param label_values: Значения меток
+        """
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def get_count(self, *label_values):
+        """ Число записанных значений """
+        with self._lock:
+            series = self._values.get(label_values)
+            return series[2] if series else 0
+
+    def collect(self):
+        """
+        Строки метрики в текстовом формате Prometheus
+
+        :return list: Список строк
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append('{}_bucket{} {}'.format(
+                        self.name, format_labels(self.label_names, label_values, le=format_value(bound)), cumulative
+                    ))
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Gauge:
+    """ Текущее значение, вычисляемое при каждом чтении метрик """
+
+    def __init__(self, name, documentation, function):
+        """
+        :param str name: Имя метрики
+        :param str documentation: Описание метрики
+        :param callable function: Функция без аргументов, возвращающая значение
+        """
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def collect(self):
+        """
+        Строки метрики в текстовом формате Prometheus
+
+        :return list: Список строк
+        """
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge',
+                f'{self.name} {format_value(self.function())}']
+
+
+class MetricsRegistry:
+    """ Набор метрик, отдаваемых по HTTP """
+
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Добавить метрику (метрика с тем же именем заменяется)
+
+        :param metric: Counter, Histogram или Gauge
+        :return: Добавленная метрика
+        """
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """
+        Все метрики в текстовом формате Prometheus
+
+        :return str: Текст для ответа на /metrics
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception:
+                logging.getLogger('bot').exception(Exception)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+STAGE_LATENCY = REGISTRY.register(Histogram('bot_stage_seconds', 'Latency of message handling stages', ['stage']))
+DB_LATENCY = REGISTRY.register(Histogram('bot_db_seconds', 'Latency of database_model functions', ['function']))
+VK_API_LATENCY = REGISTRY.register(Histogram('bot_vk_api_seconds', 'Latency of VK API requests', ['method']))
+VK_CALL_LATENCY = REGISTRY.register(Histogram('bot_vk_call_seconds',
+                                              'Latency of outbox calls including queueing and retries', ['method']))
+ERRORS = REGISTRY.register(Counter('bot_errors_total', 'Exceptions raised by instrumented functions', ['name']))
+
+
+def timed(histogram, label=None):
+    """
+    Декоратор записи длительности вызова функции в гистограмму.
+    Исключения функции учитываются в счетчике ERRORS.
+    Если сбор метрик выключен, функция возвращается без изменений.
+
+    :param Histogram histogram: Гистограмма с одной меткой
+    :param str label: Значение метки. По умолчанию - имя функции.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+        name = label or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                ERRORS.inc(name)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorator
+
+
+def instrument_vk(vk):
+    """
+    Записывать длительность всех запросов к API ВК через VkApi.method
+    (включая запросы VkApiMethod и VkOutbox)
+
+    :param VkApi vk: Сессия ВК
+    """
+    if not ENABLED:
+        return
+    method = vk.method
+
+    @functools.wraps(method)
+    def timed_method(method_name, values=None, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(method_name, values, *args, **kwargs)
+        except Exception:
+            ERRORS.inc(method_name)
+            raise
+        finally:
+            VK_API_LATENCY.observe(time.perf_counter() - started, method_name)
+    vk.method = timed_method
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """ Обработчик запросов /metrics """
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """ HTTP-сервер метрик в фоновом потоке """
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT, registry=REGISTRY):
+        """
+        :param str host: Адрес, на котором принимаются запросы
+        :param int port: Порт (0 - любой свободный)
+        :param MetricsRegistry registry: Отдаваемые метрики
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """ Запуск сервера """
+        handler = type('RequestHandler', (MetricsRequestHandler,), {'registry': self.registry})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Остановка сервера """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
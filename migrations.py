@@ -0,0 +1,109 @@
+"""
+Версионные миграции схемы БД.
+Применённые миграции записываются в таблицу schema_version.
+
+Запуск:
+    python migrations.py upgrade [--url URL]   - применить недостающие миграции
+    python migrations.py status [--url URL]    - показать текущую версию схемы
+"""
+import argparse
+from datetime import datetime
+
+import peewee
+
+from database import BaseModel, DialogsTable, EventsTable, EventVisitorsTable, PhotoAttachmentsTable, \
+    EVENTS_CHANNEL, db_handler, init_database, is_postgres
+
+EVENTS_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_events_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{EVENTS_CHANNEL}', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_changed ON events;
+CREATE TRIGGER events_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON events
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_events_changed();
+"""
+
+
+class SchemaVersionTable(BaseModel):
+    """
+    Применённые миграции схемы
+    """
+    class Meta:
+        db_table = 'schema_version'
+
+    version = peewee.IntegerField(primary_key=True, help_text='Номер миграции')
+    name = peewee.TextField(help_text='Описание миграции')
+    applied = peewee.DateTimeField(default=datetime.now, help_text='Дата и время применения')
+
+
+def create_initial_tables():
+    """ Таблицы диалогов, мероприятий и регистраций """
+    db_handler.create_tables([DialogsTable, EventsTable, EventVisitorsTable])
+
+
+def create_photo_attachments_table():
+    """ Таблица загруженных в ВК картинок """
+    db_handler.create_tables([PhotoAttachmentsTable])
+
+
+def create_events_trigger():
+    """ Уведомление об изменении мероприятий (только PostgreSQL) """
+    if is_postgres():
+        db_handler.execute_sql(EVENTS_TRIGGER_SQL)
+
+
+MIGRATIONS = [
+    (1, 'dialogs, events, event_visitors', create_initial_tables),
+    (2, 'photo_attachments', create_photo_attachments_table),
+    (3, 'events_changed trigger', create_events_trigger),
+]
+
+
+def get_current_version():
+    """
+    Текущая версия схемы БД
+
+    :return int: Номер последней применённой миграции (0 - миграции не применялись)
+    """
+    db_handler.create_tables([SchemaVersionTable])
+    return SchemaVersionTable.select(peewee.fn.MAX(SchemaVersionTable.version)).scalar() or 0
+
+
+def upgrade(target=None):
+    """
+    Применить недостающие миграции
+
+    :param int target: Версия, до которой обновить схему. По умолчанию - последняя.
+    :return list: Номера применённых миграций
+    """
+    applied = []
+    current = get_current_version()
+    for version, name, migration in MIGRATIONS:
+        if version <= current or target is not None and version > target:
+            continue
+        with db_handler.atomic():
+            migration()
+            SchemaVersionTable.insert({'version': version, 'name': name}).execute()
+        applied.append(version)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Миграции схемы БД бота')
+    parser.add_argument('command', choices=['upgrade', 'status'])
+    parser.add_argument('--url', help='Адрес БД (по умолчанию - из local_settings)')
+    parser.add_argument('--target', type=int, help='Версия, до которой обновить схему')
+    args = parser.parse_args()
+    init_database(url=args.url)
+    if args.command == 'upgrade':
+        applied = upgrade(target=args.target)
+        print(f'Применены миграции: {applied}' if applied else 'Схема БД актуальна')
+    print(f'Версия схемы БД: {get_current_version()} из {MIGRATIONS[-1][0]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from vk_api.exceptions import ApiError, TOO_MANY_RPS_CODE
+from vk_api.utils import sjson_dumps
+
+import metrics
+from exceptions import VkCallError
+
+EXECUTE_BATCH_SIZE = 25
+
+_STOP = object()
+
+
+class TokenBucket:
+    """ Ограничитель частоты запросов: не более rate запросов в секунду, всплеск до capacity """
+
+    def __init__(self, rate, capacity):
+        """
+        :param float rate: Число запросов в секунду
+        :param float capacity: Максимальное число запросов подряд без ожидания
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Получить разрешение на запрос, при необходимости дождавшись его """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+class _Call:
+    """ Вызов метода API в очереди """
+    __slots__ = ('method', 'values', 'future', 'attempt', 'enqueued', 'peer')
+
+    def __init__(self, method, values):
+        self.method = method
+        self.values = values
+        self.future = Future()
+        self.attempt = 0
+        self.enqueued = time.monotonic()
+        self.peer = values.get('peer_id', values.get('user_id'))
+
+
+class VkOutbox:
+    """
+    Очередь исходящих вызовов API ВК.
+    Вызовы отправляются фоновым потоком с ограничением частоты, накопившиеся вызовы
+    объединяются (до 25) в один запрос execute. Вызовы, отклоненные из-за превышения
+    частоты запросов (ошибка 6), повторяются с нарастающей задержкой.
+    Вызовы для одного собеседника (peer_id или user_id) выполняются строго по очереди:
+    следующий вызов отправляется только после завершения предыдущего, в том числе
+    после всех его повторов, поэтому сообщения не приходят не по порядку.
+    """
+
+    def __init__(self, vk, rate, max_retries, backoff, batch_size=EXECUTE_BATCH_SIZE):
+        """
+        :param vk_api.VkApi vk: Сессия ВК (или объект с таким же методом method)
+        :param float rate: Максимальное число запросов к API в секунду
+        :param int max_retries: Максимальное число повторов вызова
+        :param float backoff: Задержка перед первым повтором в секундах, далее удваивается
+        :param int batch_size: Максимальное число вызовов в одном запросе execute
+        """
+        self.vk = vk
+        self.bucket = TokenBucket(rate=rate, capacity=rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.batch_size = batch_size
+        self.log = logging.getLogger('bot')
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.requests = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self._queue = queue.Queue()
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._busy_peers = set()
+        self._held = dict()
+        self._ready = deque()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def queue_depth(self):
+        """ Число вызовов, ожидающих отправки """
+        return (self._queue.qsize() + len(self._delayed) + len(self._ready)
+                + sum(len(calls) for calls in list(self._held.values())))
+
+    @property
+    def stats(self):
+        """ Показатели работы очереди """
+        with self._stats_lock:
+            return {'queue_depth': self.queue_depth,
+                    'requests': self.requests,
+                    'sent': self.sent,
+                    'failed': self.failed,
+                    'retried': self.retried,
+                    'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+                    'latency_max': self.latency_max}
+
+    def start(self):
+        """ Запуск фонового потока отправки """
+        self._thread = threading.Thread(target=self._run, name='vk-outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Остановка фонового потока после отправки всех вызовов из очереди """
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def call(self, method, **values):
+        """
+        Поставить вызов метода API в очередь
+
+        :param str method: Метод API, например 'messages.send'
+        :param values: Параметры метода (None-значения не передаются)
+        :return Future: Future с результатом вызова
+        """
+        call = _Call(method=method, values={key: value for key, value in values.items() if value is not None})
+        self._queue.put(call)
+        return call.future
+
+    def _run(self):
+        stopping = False
+        while not stopping or self._delayed or self._ready or not self._queue.empty():
+            batch, stop = self._next_batch(stopping=stopping)
+            stopping = stopping or stop
+            if batch:
+                self.bucket.acquire()
+                self._send(batch)
+
+    def _next_batch(self, stopping):
+        """
+        Собрать пакет вызовов: сначала повторы, срок которых подошел, затем вызовы,
+        дождавшиеся завершения предыдущего вызова своему собеседнику, затем новые
+        """
+        stop = False
+        batch = []
+        if self._ready:
+            timeout = 0
+        elif self._delayed:
+            timeout = 0 if stopping else max(0, self._delayed[0][0] - time.monotonic())
+        else:
+            timeout = None
+        try:
+            item = self._queue.get(timeout=timeout) if timeout != 0 else self._queue.get_nowait()
+            if item is _STOP:
+                stop = True
+            else:
+                self._hold_or_add(call=item, batch=batch)
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        while self._delayed and len(batch) < self.batch_size and (stopping or self._delayed[0][0] <= now):
+            batch.append(heapq.heappop(self._delayed)[2])
+        while self._ready and len(batch) < self.batch_size:
+            batch.append(self._ready.popleft())
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+            else:
+                self._hold_or_add(call=item, batch=batch)
+        return batch, stop
+
+    def _hold_or_add(self, call, batch):
+        """ Добавить новый вызов в пакет или отложить до завершения предыдущего вызова тому же собеседнику """
+        if call.peer is None:
+            batch.append(call)
+        elif call.peer in self._busy_peers:
+            self._held.setdefault(call.peer, deque()).append(call)
+        else:
+            self._busy_peers.add(call.peer)
+            batch.append(call)
+
+    def _release(self, call):
+        """ Передать в отправку следующий отложенный вызов собеседнику завершенного вызова """
+        if call.peer is None:
+            return
+        held = self._held.get(call.peer)
+        if held:
+            self._ready.append(held.popleft())
+            if not held:
+                del self._held[call.peer]
+        else:
+            self._busy_peers.discard(call.peer)
+
+    def _send(self, batch):
+        """ Отправка пакета вызовов одним запросом """
+        with self._stats_lock:
+            self.requests += 1
+        try:
+            if len(batch) == 1:
+                results, errors = [self.vk.method(batch[0].method, batch[0].values)], iter(())
+            else:
+                code = 'return [{}];'.format(','.join(
+                    'API.{}({})'.format(call.method, sjson_dumps(call.values)) for call in batch
+                ))
+                response = self.vk.method('execute', {'code': code}, raw=True)
+                results, errors = response['response'], iter(response.get('execute_errors', []))
+        except ApiError as exc:
+            for call in batch:
+                if exc.code == TOO_MANY_RPS_CODE:
+                    self._retry(call=call, error=exc)
+                else:
+                    self._finish(call=call, error=exc)
+            return
+        except Exception as exc:
+            for call in batch:
+                self._finish(call=call, error=exc)
+            return
+        for call, result in zip(batch, results):
+            if result is False:
+                error = VkCallError(next(errors, {}))
+                if error.code == TOO_MANY_RPS_CODE:
+                    self._retry(call=call, error=error)
+                else:
+                    self._finish(call=call, error=error)
+            else:
+                self._finish(call=call, result=result)
+
+    def _retry(self, call, error):
+        """ Повтор вызова с задержкой """
+        if call.attempt >= self.max_retries:
+            self._finish(call=call, error=error)
+            return
+        delay = self.backoff * 2 ** call.attempt
+        call.attempt += 1
+        with self._stats_lock:
+            self.retried += 1
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), call))
+
+    def _finish(self, call, result=None, error=None):
+        """ Завершение вызова с результатом или ошибкой """
+        latency = time.monotonic() - call.enqueued
+        with self._stats_lock:
+            if error is None:
+                self.sent += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+            else:
+                self.failed += 1
+        if metrics.ENABLED:
+            metrics.VK_CALL_LATENCY.observe(latency, call.method)
+        self._release(call)
+        if error is None:
+            call.future.set_result(result)
+        else:
+            self.log.error(f'{call.method} failed: {error}')
+            call.future.set_exception(error)
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import threading
+import time
+
+import requests
+
+import database_model
+from database import unit_of_work
+from exceptions import PhotoUploadError
+from metrics import STAGE_LATENCY, timed
+from session_cache import SessionCache
+
+
+class PhotoUploader:
+    """
+    Загрузка картинок для отправки в сообщениях ВК.
+    Загруженные вложения запоминаются по хэшу содержимого (в памяти и в БД), поэтому
+    одинаковая картинка загружается один раз. Запросы к БД выполняются в отдельных коротких
+    единицах работы: загрузку следует вызывать вне транзакции обработки события. Адрес сервера загрузки используется повторно,
+    пока не истечет его срок, HTTP-соединения берутся из одной сессии.
+    """
+
+    def __init__(self, api, session, upload_url_ttl, upload_timeout, cache_size, cache_ttl):
+        """
+        :param vk_api.vk_api.VkApiMethod api: API ВК
+        :param requests.Session session: HTTP-сессия для загрузки
+        :param float upload_url_ttl: Время использования адреса сервера загрузки в секундах
+        :param float upload_timeout: Таймаут загрузки в секундах
+        :param int cache_size: Число вложений, хранимых в памяти
+        :param float cache_ttl: Время хранения вложения в памяти в секундах
+        """
+        self.api = api
+        self.session = session
+        self.upload_url_ttl = upload_url_ttl
+        self.upload_timeout = upload_timeout
+        self.log = logging.getLogger('bot')
+        self._attachments = SessionCache(loader=self._load_attachment, maxsize=cache_size, ttl=cache_ttl)
+        self._upload_url = None
+        self._upload_url_expires = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_content_hash(image):
+        """
+        Хэш содержимого картинки
+
+        :param bytes image: Картинка
+        :rtype str
+        """
+        return hashlib.sha256(image).hexdigest()
+
+    @staticmethod
+    def _load_attachment(content_hash):
+        """ Загрузка вложения из БД """
+        with unit_of_work():
+            return database_model.get_photo_attachment(content_hash)
+
+    def get_attachment(self, content_hash):
+        """
+        Получить ранее загруженное вложение.
+        Отсутствие вложения не кэшируется: при промахе выполняется запрос к БД,
+        а после загрузки вложение помещается в кэш (см. upload).
+
+        :param str content_hash: Хэш содержимого картинки
+        :return str: Вложение вида photo{owner_id}_{media_id} или None
+        """
+        return self._attachments.get(content_hash)
+
+    @timed(STAGE_LATENCY, 'upload_photo')
+    def upload(self, image, content_hash=None, lookup=True):
+        """
+        Загрузить картинку (если она не была загружена ранее)
+
+        :param bytes image: Картинка в формате PNG
+        :param str content_hash: Ключ картинки в кэше. По умолчанию - хэш содержимого.
+        :param bool lookup: Искать ранее загруженное вложение. False, если вызывающий уже проверил
+                            его отсутствие (см. get_attachment).
+        :return str: Вложение вида photo{owner_id}_{media_id}
+        :raises PhotoUploadError: Картинка не загружена и после повторной попытки
+        """
+        content_hash = content_hash or self.get_content_hash(image)
+        if lookup:
+            attachment = self.get_attachment(content_hash)
+            if attachment is not None:
+                return attachment
+        upload_data = self._post(image=image, upload_url=self._get_upload_url())
+        if not self._is_uploaded(upload_data):
+            upload_data = self._post(image=image, upload_url=self._get_upload_url(refresh=True))
+            if not self._is_uploaded(upload_data):
+                raise PhotoUploadError(f'upload server did not accept the image {content_hash}')
+        image_data = self.api.photos.saveMessagesPhoto(**upload_data)
+        attachment = 'photo{}_{}'.format(image_data[0]['owner_id'], image_data[0]['id'])
+        with unit_of_work() as database:
+            database_model.save_photo_attachment(content_hash=content_hash, attachment=attachment)
+        if not database.in_transaction():
+            # Вложение зафиксировано в БД. Внутри внешней транзакции, которая еще может откатиться,
+            # кэш не заполняется: вложение будет прочитано из БД при следующем обращении.
+            self._attachments.put(content_hash, attachment)
+        return attachment
+
+    def _get_upload_url(self, refresh=False):
+        """ Адрес сервера загрузки, при необходимости запрашивается новый """
+        with self._lock:
+            if refresh or self._upload_url is None or time.monotonic() >= self._upload_url_expires:
+                self._upload_url = self.api.photos.getMessagesUploadServer()['upload_url']
+                self._upload_url_expires = time.monotonic() + self.upload_url_ttl
+            return self._upload_url
+
+    def _post(self, image, upload_url):
+        """ Загрузка картинки на сервер ВК """
+        try:
+            response = self.session.post(url=upload_url, files={'photo': ('image.png', image, 'image/png')},
+                                         timeout=self.upload_timeout)
+            return response.json()
+        except (requests.RequestException, ValueError):
+            self.log.exception(Exception)
+            return {}
+
+    @staticmethod
+    def _is_uploaded(upload_data):
+        """ Проверка ответа сервера загрузки """
+        return upload_data.get('photo') not in (None, '', '[]')
@@ -0,0 +1,101 @@
+import logging
+import threading
+
+import database_model
+from database import unit_of_work
+
+USERS_GET_MAX_IDS = 1000
+
+
+class ProfileCollector:
+    """
+    Сбор дополнительной информации о собеседниках в фоне.
+    id пользователей копятся и запрашиваются через users.get пакетами (до 1000 id за вызов),
+    имена записываются в БД одним запросом.
+    """
+
+    def __init__(self, outbox, api_version, flush_interval, batch_size=USERS_GET_MAX_IDS, on_collected=None):
+        """
+        :param VkOutbox outbox: Очередь вызовов API ВК
+        :param str api_version: Версия API ВК
+        :param float flush_interval: Интервал запроса накопленных id в секундах
+        :param int batch_size: Число id, при котором запрос выполняется досрочно (не более 1000)
+        :param callable on_collected: Вызывается с полученными именами: on_collected({user_id: user_name})
+        """
+        self.outbox = outbox
+        self.api_version = api_version
+        self.flush_interval = flush_interval
+        self.batch_size = min(batch_size, USERS_GET_MAX_IDS)
+        self.on_collected = on_collected
+        self.log = logging.getLogger('bot')
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """ Запуск фонового потока сбора """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='profile-collector', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Остановка фонового потока со сбором накопленных id """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.collect()
+
+    def add(self, user_id):
+        """
+        Запросить сбор информации о пользователе
+
+        :param int user_id: id пользователя
+        """
+        with self._lock:
+            self._pending.add(user_id)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def collect(self):
+        """
+        Запросить информацию по всем накопленным id.
+        При ошибке id пакета возвращаются в очередь и запрашиваются при следующем сборе.
+        """
+        while True:
+            with self._lock:
+                user_ids = [self._pending.pop() for _ in range(min(self.batch_size, len(self._pending)))]
+            if not user_ids:
+                return
+            try:
+                self._collect(user_ids=user_ids)
+            except Exception:
+                self.log.exception(Exception)
+                with self._lock:
+                    self._pending.update(user_ids)
+                return
+
+    def _collect(self, user_ids):
+        """ Получение и сохранение имен пакета пользователей """
+        info = self.outbox.call('users.get', user_ids=','.join(str(user_id) for user_id in user_ids),
+                                fields='photo_50,city', v=self.api_version).result()
+        user_names = dict()
+        for user in info:
+            user_name = '{} {}'.format(user['last_name'], user['first_name']).strip()
+            if user_name:
+                user_names[user['id']] = user_name
+        if not user_names:
+            return
+        with unit_of_work():
+            database_model.update_user_names(user_names=user_names)
+        if self.on_collected is not None:
+            self.on_collected(user_names)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+            self.collect()
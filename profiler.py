@@ -0,0 +1,129 @@
+"""
+Профилирование обработки сообщений на работающем боте.
+Включается переменной окружения BOT_PROFILE=1 или сигналом SIGUSR1 (повторный сигнал выключает).
+Профилируется каждый PROFILER_EVERY-й вызов; если задан PROFILER_SLOW_THRESHOLD, профилируются
+все вызовы, а сохраняются выбранные и те, что длились дольше порога.
+Для каждого сохраненного вызова в PROFILER_DIR пишутся дамп cProfile (.prof, открывается pstats
+или snakeviz) и краткая сводка самых затратных функций (.txt); старые файлы удаляются.
+При выключенном профилировании обертка только проверяет флаг.
+"""
+import cProfile
+import functools
+import io
+import itertools
+import logging
+import pathlib
+import pstats
+import threading
+import time
+from datetime import datetime
+
+from settings import (PROFILER_DIR, PROFILER_ENABLED, PROFILER_EVERY, PROFILER_MAX_DUMPS, PROFILER_SLOW_THRESHOLD,
+                      PROFILER_TOP)
+
+
+class SamplingProfiler:
+    """
+    Выборочное профилирование вызовов функции.
+    Одновременно профилируется не больше одного вызова: остальные в это время выполняются без профилировщика.
+    """
+
+    def __init__(self, directory=PROFILER_DIR, enabled=PROFILER_ENABLED, every=PROFILER_EVERY,
+                 slow_threshold=PROFILER_SLOW_THRESHOLD, max_dumps=PROFILER_MAX_DUMPS, top=PROFILER_TOP):
+        """
+        :param directory: Каталог для дампов (pathlib.Path или str)
+        :param bool enabled: Профилирование включено
+        :param int every: Профилировать каждый every-й вызов (0 - не выбирать вызовы по номеру)
+        :param float slow_threshold: Сохранять вызовы дольше порога в секундах (None - не сохранять)
+        :param int max_dumps: Число хранимых дампов, более старые удаляются
+        :param int top: Число функций в текстовой сводке
+        """
+        self.directory = pathlib.Path(directory)
+        self.enabled = enabled
+        self.every = every
+        self.slow_threshold = slow_threshold
+        self.max_dumps = max_dumps
+        self.top = top
+        self.dumps = 0
+        self.log = logging.getLogger('bot')
+        self._calls = itertools.count(1)
+        self._busy = threading.Lock()
+        self._files_lock = threading.Lock()
+
+    def toggle(self):
+        """ Включить или выключить профилирование (обработчик сигнала) """
+        self.enabled = not self.enabled
+        self.log.info(f'Profiler is {"enabled" if self.enabled else "disabled"}, dumps are written to {self.directory}')
+
+    def profile(self, func):
+        """
+        Декоратор выборочного профилирования функции
+
+        :param callable func: Профилируемая функция
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            return self.call(func, *args, **kwargs)
+        return wrapper
+
+    def call(self, func, *args, **kwargs):
+        """
+        Вызов функции под профилировщиком, если вызов попадает в выборку
+
+        :param callable func: Вызываемая функция
+        :return: Результат функции
+        """
+        sampled = self.every > 0 and next(self._calls) % self.every == 0
+        if not (sampled or self.slow_threshold is not None) or not self._busy.acquire(blocking=False):
+            return func(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            started = time.perf_counter()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                duration = time.perf_counter() - started
+                slow = self.slow_threshold is not None and duration >= self.slow_threshold
+                if sampled or slow:
+                    self.save(profile, name=func.__name__, duration=duration, reason='slow' if slow else 'sample')
+        finally:
+            self._busy.release()
+
+    def save(self, profile, name, duration, reason):
+        """
+        Запись дампа и текстовой сводки, удаление старых дампов
+
+        :param cProfile.Profile profile: Профиль вызова
+        :param str name: Имя профилированной функции
+        :param float duration: Длительность вызова в секундах
+        :param str reason: Причина сохранения (sample или slow)
+        """
+        try:
+            with self._files_lock:
+                self.dumps += 1
+                self.directory.mkdir(parents=True, exist_ok=True)
+                stem = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{self.dumps:06d}-{name}-{reason}-{duration * 1000:.0f}ms'
+                profile.dump_stats(str(self.directory / f'{stem}.prof'))
+                summary = io.StringIO()
+                summary.write(f'{name}: {duration * 1000:.1f} ms ({reason})\n')
+                pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(self.top)
+                (self.directory / f'{stem}.txt').write_text(summary.getvalue(), encoding='UTF-8')
+                self.rotate()
+        except Exception:
+            self.log.exception(f'Failed to save profile of {name}')
+
+    def rotate(self):
+        """ Удаление дампов сверх max_dumps, начиная с самых старых """
+        dumps = sorted(self.directory.glob('*.prof'))
+        for dump in dumps[:max(0, len(dumps) - self.max_dumps)]:
+            dump.unlink()
+            summary = dump.with_suffix('.txt')
+            if summary.exists():
+                summary.unlink()
+
+
+PROFILER = SamplingProfiler()
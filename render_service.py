@@ -0,0 +1,77 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from exceptions import RenderQueueFullError
+from metrics import STAGE_LATENCY, timed
+from ticket_maker import render_ticket
+
+
+class RenderService:
+    """
+    Отрисовка билетов в пуле процессов, вне потока обработки сообщений.
+    Число заданий в работе ограничено, при переполнении новое задание отклоняется.
+    """
+
+    def __init__(self, max_workers, max_queue, timeout):
+        """
+        :param int max_workers: Число процессов. 0 - отрисовка в вызывающем потоке.
+        :param int max_queue: Максимальное число заданий в очереди и в работе
+        :param float timeout: Время ожидания результата задания в секундах
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        """
+        Поставить задание на отрисовку
+
+        :param TicketJob job: Задание на отрисовку
+        :return Future: Future с билетом в формате PNG (bytes)
+        """
+        if not self._slots.acquire(blocking=False):
+            raise RenderQueueFullError('Too many tickets are being rendered')
+        try:
+            if self.max_workers:
+                future = self._get_executor().submit(render_ticket, job)
+            else:
+                future = Future()
+                try:
+                    future.set_result(render_ticket(job))
+                except Exception as exc:
+                    future.set_exception(exc)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @timed(STAGE_LATENCY, 'render_ticket')
+    def render(self, job):
+        """
+        Отрисовать билет, ожидая результат не дольше timeout
+
+        :param TicketJob job: Задание на отрисовку
+        :return bytes: Билет в формате PNG
+        """
+        return self.submit(job).result(timeout=self.timeout)
+
+    def shutdown(self):
+        """ Остановка пула процессов """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Процессы, созданные fork из многопоточного бота, могут унаследовать захваченные
+                # блокировки и зависнуть, поэтому процессы запускаются через forkserver/spawn
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context(start_method))
+            return self._executor
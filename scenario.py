@@ -0,0 +1,141 @@
+"""
+Сценарии, скомпилированные из описания (settings.SCENARIOS) в неизменяемый граф шагов.
+Обработчики шагов находятся в модуле handlers при компиляции, ошибки описания
+(неизвестный обработчик или шаг, недостижимый шаг) обнаруживаются при запуске бота.
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+from exceptions import ScenarioConfigError
+
+
+class Step:
+    """ Шаг сценария. Следующий шаг и обработчики - готовые объекты. """
+    __slots__ = ('name', 'context', 'handler', 'error_response', 'send_image', 'next_step')
+
+    def __init__(self, name, context, handler, error_response, send_image):
+        """
+        :param str name: Имя шага
+        :param str context: Текст сообщения при переходе на шаг
+        :param callable handler: Проверка ответа пользователя на шаге (у завершающего шага - действие при завершении)
+        :param str error_response: Текст сообщения, если ответ не прошел проверку
+        :param callable send_image: Формирование задания на отрисовку картинки (TicketJob) или None
+        """
+        for attr, value in (('name', name), ('context', context), ('handler', handler),
+                            ('error_response', error_response), ('send_image', send_image), ('next_step', None)):
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError('Step is immutable')
+
+    def __repr__(self):
+        return f'Step({self.name!r})'
+
+    @property
+    def is_final(self):
+        """ Завершающий шаг сценария """
+        return self.next_step is None
+
+
+class Scenario(namedtuple('Scenario', ['name', 'first_step', 'steps'])):
+    """ Сценарий: первый шаг и шаги по именам (для восстановления состояния пользователя) """
+    __slots__ = ()
+
+    def get_step(self, step_name):
+        """
+        Шаг по имени
+
+        :param str step_name: Имя шага
+        :return Step: Шаг или None, если такого шага нет
+        """
+        return self.steps.get(step_name)
+
+
+def resolve_handler(handlers, handler_name, where):
+    """
+    Найти обработчик по имени
+
+    :param handlers: Модуль (объект) с обработчиками
+    :param str handler_name: Имя обработчика
+    :param str where: Место использования (для сообщения об ошибке)
+    :return callable: Обработчик или None, если имя не задано
+    """
+    if not handler_name:
+        return None
+    handler = getattr(handlers, handler_name, None)
+    if not callable(handler):
+        raise ScenarioConfigError(f'{where}: unknown handler {handler_name!r}')
+    return handler
+
+
+def compile_scenario(scenario_name, description, handlers):
+    """
+    Компиляция описания сценария
+
+    :param str scenario_name: Имя сценария
+    :param dict description: Описание сценария ({'first_step': ..., 'steps': {...}})
+    :param handlers: Модуль (объект) с обработчиками
+    :return Scenario: Скомпилированный сценарий
+    """
+    if not isinstance(description, dict) or not isinstance(description.get('steps'), dict):
+        raise ScenarioConfigError(f'{scenario_name}: scenario has no steps')
+    steps = dict()
+    for step_name, step in description['steps'].items():
+        where = f'{scenario_name}.{step_name}'
+        if not isinstance(step, dict) or 'context' not in step:
+            raise ScenarioConfigError(f'{where}: step has no context')
+        steps[step_name] = Step(name=step_name, context=step['context'],
+                                handler=resolve_handler(handlers, step.get('handler'), where),
+                                error_response=step.get('error_response'),
+                                send_image=resolve_handler(handlers, step.get('send_image'), where))
+    for step_name, step in description['steps'].items():
+        next_step_name = step.get('next_step')
+        if not next_step_name:
+            continue
+        if next_step_name not in steps:
+            raise ScenarioConfigError(f'{scenario_name}.{step_name}: unknown next step {next_step_name!r}')
+        object.__setattr__(steps[step_name], 'next_step', steps[next_step_name])
+    first_step = steps.get(description.get('first_step'))
+    if first_step is None:
+        raise ScenarioConfigError(f'{scenario_name}: unknown first step {description.get("first_step")!r}')
+    reachable = set()
+    step = first_step
+    while step is not None and step.name not in reachable:
+        reachable.add(step.name)
+        if not step.is_final and (step.handler is None or step.error_response is None):
+            raise ScenarioConfigError(f'{scenario_name}.{step.name}: step needs a handler and an error response')
+        step = step.next_step
+    if step is not None:
+        raise ScenarioConfigError(f'{scenario_name}: scenario has no final step')
+    unreachable = set(steps) - reachable
+    if unreachable:
+        raise ScenarioConfigError(f'{scenario_name}: unreachable steps {sorted(unreachable)}')
+    if first_step.is_final:
+        raise ScenarioConfigError(f'{scenario_name}: first step can not be final')
+    return Scenario(name=scenario_name, first_step=first_step, steps=MappingProxyType(steps))
+
+
+def compile_scenarios(scenarios, handlers):
+    """
+    Компиляция описаний всех сценариев
+
+    :param dict scenarios: Описания сценариев (settings.SCENARIOS)
+    :param handlers: Модуль (объект) с обработчиками
+    :return MappingProxyType: Неизменяемый словарь {имя сценария: Scenario}
+    """
+    return MappingProxyType({name: compile_scenario(name, description, handlers)
+                             for name, description in scenarios.items()})
+
+
+def validate_intents(intents, scenarios, handlers):
+    """
+    Проверка ссылок намерений на сценарии и обработчики
+
+    :param list intents: Описания намерений (settings.INTENTS)
+    :param scenarios: Скомпилированные сценарии
+    :param handlers: Модуль (объект) с обработчиками
+    """
+    for intent in intents:
+        if intent.get('scenario') is not None and intent['scenario'] not in scenarios:
+            raise ScenarioConfigError(f'intent {intent["name"]!r}: unknown scenario {intent["scenario"]!r}')
+        resolve_handler(handlers, intent.get('handler'), f'intent {intent["name"]!r}')
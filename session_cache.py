@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionCache:
+    """
+    Кэш сессий пользователей в памяти процесса.
+    Ограничен по числу записей (вытесняются давно не использовавшиеся) и по времени
+    жизни записи с момента последнего обращения. При промахе запись загружается loader'ом.
+    """
+
+    def __init__(self, loader, maxsize, ttl):
+        """
+        :param callable loader: Функция загрузки записи по ключу, вызывается как loader(key)
+        :param int maxsize: Максимальное число записей
+        :param float ttl: Время жизни записи в секундах с момента последнего обращения
+        """
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._get_alive(key=key, now=time.monotonic()) is not None
+
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def get(self, key):
+        """
+        Получить запись из кэша, при отсутствии - загрузить.
+        Если loader вернул None (записи нет), в кэш ничего не помещается.
+
+        :param key: Ключ записи (id пользователя)
+        """
+        now = time.monotonic()
+        with self._lock:
+            value = self._get_alive(key=key, now=now)
+            if value is not None:
+                self.hits += 1
+                self._data[key] = (value, now)
+                self._data.move_to_end(key)
+                return value
+            self.misses += 1
+        value = self.loader(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def peek(self, key):
+        """
+        Получить запись из кэша без загрузки и без учета в счетчиках
+
+        :param key: Ключ записи (id пользователя)
+        :return: Значение или None
+        """
+        with self._lock:
+            item = self._data.get(key)
+        return item[0] if item is not None else None
+
+    def put(self, key, value):
+        """
+        Поместить запись в кэш
+
+        :param key: Ключ записи (id пользователя)
+        :param value: Значение
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._data[key] = (value, now)
+            self._data.move_to_end(key)
+            self._evict(now=now)
+
+    def invalidate(self, key):
+        """
+        Удалить запись из кэша
+
+        :param key: Ключ записи (id пользователя)
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def values(self):
+        """ Список актуальных записей """
+        now = time.monotonic()
+        with self._lock:
+            return [value for value, accessed in self._data.values() if now - accessed <= self.ttl]
+
+    @property
+    def stats(self):
+        """ Счетчики работы кэша """
+        return {'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations}
+
+    def _get_alive(self, key, now):
+        """ Получить значение записи, если она есть и не устарела """
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, accessed = item
+        if now - accessed > self.ttl:
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return value
+
+    def _evict(self, now):
+        """ Вытеснить устаревшие записи и записи сверх лимита """
+        while self._data:
+            key, (value, accessed) = next(iter(self._data.items()))
+            if now - accessed > self.ttl:
+                self.expirations += 1
+            elif len(self._data) > self.maxsize:
+                self.evictions += 1
+            else:
+                break
+            del self._data[key]
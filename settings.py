@@ -1,3 +1,4 @@
+import os
 import pathlib
 import re
 
@@ -8,6 +9,51 @@ RE_MULTIPLE_SPACES = re.compile(pattern=r'\s{2,}')
 RE_NAME = re.compile(r'^[a-zА-Я].{,24}$', flags=re.IGNORECASE)
 RE_EMAIL = re.compile(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)", flags=re.IGNORECASE)
 WORK_DIR = pathlib.Path().absolute()
+MAX_EVENTS_IN_FLIGHT = 16
+SESSION_CACHE_SIZE = 10000
+SESSION_CACHE_TTL = 30 * 60
+DIALOG_FLUSH_INTERVAL = 5
+DIALOG_FLUSH_SIZE = 500
+AVATAR_CACHE_DIR = WORK_DIR / 'avatars'
+AVATAR_CACHE_MAX_BYTES = 50 * 1024 * 1024
+RENDER_WORKERS = 2
+RENDER_QUEUE_SIZE = 32
+RENDER_TIMEOUT = 10
+UPLOAD_URL_TTL = 10 * 60
+UPLOAD_TIMEOUT = 30
+ATTACHMENT_CACHE_SIZE = 10000
+ATTACHMENT_CACHE_TTL = 24 * 60 * 60
+VK_API_RATE = 20
+VK_API_MAX_RETRIES = 5
+VK_API_BACKOFF = 0.5
+PROFILE_FLUSH_INTERVAL = 2
+PROFILE_BATCH_SIZE = 1000
+EVENTS_CACHE_TTL = 5 * 60
+DB_POOL_MIN_SIZE = 2
+DB_POOL_MAX_SIZE = 20
+DB_POOL_STALE_TIMEOUT = 60 * 60
+DB_POOL_IDLE_TIMEOUT = 5 * 60
+DB_POOL_WAIT_TIMEOUT = 10
+DB_POOL_HEALTH_CHECK_INTERVAL = 30
+METRICS_ENABLED = os.environ.get('BOT_METRICS') == '1'
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9100
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+LOG_QUEUE_SIZE = 10000
+PROFILER_ENABLED = os.environ.get('BOT_PROFILE') == '1'
+PROFILER_EVERY = int(os.environ.get('BOT_PROFILE_EVERY', 100))
+PROFILER_SLOW_THRESHOLD = float(os.environ['BOT_PROFILE_SLOW']) if os.environ.get('BOT_PROFILE_SLOW') else None
+PROFILER_DIR = WORK_DIR / 'profiles'
+PROFILER_MAX_DUMPS = 50
+PROFILER_TOP = 25
+CALLBACK_HOST = '0.0.0.0'
+CALLBACK_PORT = 8080
+CALLBACK_PATH = '/callback'
+CALLBACK_DEDUP_SIZE = 10000
+CALLBACK_MAX_BODY = 1024 * 1024
+CALLBACK_IDLE_TIMEOUT = 60
+CALLBACK_CACHE_SESSIONS = False
 
 INTENTS = [
     {
@@ -0,0 +1,51 @@
+from chatbot.avatar import AvatarCache, make_identicon
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+
+class TestAvatar(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def cache_size(self):
+        return sum(os.path.getsize(path) for path in self.path.glob('*.png'))
+
+    def test_identicon_deterministic(self):
+        first = make_identicon(seed='vladimir@example.com', size=50)
+        self.assertEqual(first.tobytes(), make_identicon(seed='vladimir@example.com', size=50).tobytes())
+        self.assertNotEqual(first.tobytes(), make_identicon(seed='maria@example.com', size=50).tobytes())
+
+    def test_cache_hit_does_not_render(self):
+        cache = AvatarCache(directory=self.path, max_bytes=1024 * 1024)
+        avatar = cache.get(seed='vladimir@example.com', size=50)
+        with patch('chatbot.avatar.make_identicon') as make_identicon_mock:
+            cached = cache.get(seed='vladimir@example.com', size=50)
+        make_identicon_mock.assert_not_called()
+        self.assertEqual(cached.tobytes(), avatar.tobytes())
+
+    def test_eviction_keeps_size_within_limit(self):
+        cache = AvatarCache(directory=self.path, max_bytes=1024 * 1024)
+        cache.get(seed='seed', size=50)
+        max_bytes = self.cache_size() * 5
+        cache = AvatarCache(directory=self.path, max_bytes=max_bytes)
+        for number in range(20):
+            cache.get(seed=f'user{number}@example.com', size=50)
+            self.assertLessEqual(self.cache_size(), max_bytes)
+        self.assertEqual(cache.total_bytes, self.cache_size())
+        self.assertEqual(cache.count, len(list(self.path.glob('*.png'))))
+
+    def test_no_directory_scan_below_limit(self):
+        cache = AvatarCache(directory=self.path, max_bytes=1024 * 1024)
+        cache.get(seed='first', size=50)
+        with patch('chatbot.avatar.os.scandir') as scandir:
+            for number in range(5):
+                cache.get(seed=f'user{number}@example.com', size=50)
+        scandir.assert_not_called()
+        self.assertEqual(cache.count, 6)
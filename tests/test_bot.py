@@ -43,6 +43,7 @@ class TestBot(unittest.TestCase):
         event = Mock(return_value=self.ROW_EVENT)
         event.type = Mock()
         event.type.value = self.ROW_EVENT['type']
+        event.raw = self.ROW_EVENT
         return [event, ]
 
     def test_run(self):
@@ -51,6 +52,8 @@ class TestBot(unittest.TestCase):
         message_handling_mock = Mock()
         with patch('chatbot.bot.VkApi'), \
                 patch('chatbot.bot.VkBotLongPoll', return_value=long_poll_listen_mock), \
+                patch('chatbot.bot.warm_up_pool'), \
+                patch('chatbot.bot.upcoming_events'), \
                 patch('chatbot.bot.logging'):
             bot = ChatBot('', '')
             bot.message_handling = message_handling_mock
@@ -89,5 +92,159 @@ class TestBot(unittest.TestCase):
                 user_id=8023886
             )
 
+    def test_classify_events(self):
+        from vk_api.bot_longpoll import VkBotMessageEvent
+        typing = Mock()
+        typing.type.value = 'message_typing_state'
+        raw = dict(self.ROW_EVENT, object={'message': dict(self.ROW_EVENT['object']['message'], peer_id=8023886)})
+        events = [VkBotMessageEvent(raw), typing, VkBotMessageEvent(raw)]
+        with patch('chatbot.bot.logging'):
+            bot = ChatBot('', '')
+            intents = bot.classify_events(events)
+        self.assertEqual(intents[0]['handler'], 'handle_hello')
+        self.assertIs(intents[2], intents[0])
+        self.assertNotIsInstance(intents[1], dict)
+
+    def test_serve_callback(self):
+        import asyncio
+        import json
+        from urllib.request import Request, urlopen
+        raw = dict(self.ROW_EVENT, group_id=1, event_id='0' * 40, secret='secret',
+                   object={'message': dict(self.ROW_EVENT['object']['message'], peer_id=8023886)})
+        with patch('chatbot.bot.logging'):
+            bot = ChatBot('', 1)
+        bot.message_handling = Mock()
+
+        def post(port):
+            request = Request(f'http://127.0.0.1:{port}/callback', data=json.dumps(raw).encode('utf-8'))
+            with urlopen(request, timeout=5) as response:
+                return response.read()
+
+        async def main():
+            started = asyncio.get_event_loop().create_future()
+            serving = asyncio.ensure_future(bot.serve_callback(confirmation_code='a1b2c3', secret='secret',
+                                                               host='127.0.0.1', port=0, max_in_flight=2,
+                                                               started=started))
+            server = await started
+            self.assertEqual(await asyncio.get_event_loop().run_in_executor(None, post, server.port), b'ok')
+            await asyncio.sleep(0.1)
+            serving.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await serving
+
+        asyncio.run(main())
+        bot.message_handling.assert_called_once()
+        event, intent = bot.message_handling.call_args[0]
+        self.assertEqual(event.message.text, 'Привет!')
+        self.assertEqual(intent['handler'], 'handle_hello')
+
+    def test_is_message_event(self):
+        from chatbot.callback_server import parse_event
+        raw = dict(self.ROW_EVENT, object={'message': dict(self.ROW_EVENT['object']['message'], peer_id=8023886)})
+        self.assertTrue(ChatBot.is_message_event(parse_event(raw)))
+        self.assertFalse(ChatBot.is_message_event(parse_event({'type': 'group_join', 'object': {}, 'group_id': 1})))
+        unknown = parse_event({'type': 'unknown_event_type', 'object': {}, 'group_id': 1})
+        self.assertIsInstance(unknown.type, str)
+        self.assertFalse(ChatBot.is_message_event(unknown))
+
+    def test_sessions_not_cached_between_events(self):
+        from chatbot.session_cache import SessionCache
+        from vk_api.bot_longpoll import VkBotMessageEvent
+        raw = dict(self.ROW_EVENT, object={'message': dict(self.ROW_EVENT['object']['message'], peer_id=8023886)})
+        with patch('chatbot.bot.logging'):
+            bot = ChatBot('', '')
+        loader = Mock(return_value=Mock(scenario_state=None, **{'is_need_to_collect_user_info.return_value': False}))
+        bot.dialogs = SessionCache(loader=loader, maxsize=10, ttl=60)
+        bot.find_intent = Mock(return_value='Привет!')
+        bot.send_message = Mock()
+        bot.dialog_to_db = Mock()
+        for cache_sessions, loads in ((True, 1), (False, 2)):
+            loader.reset_mock()
+            bot.dialogs.invalidate(8023886)
+            bot.cache_sessions = cache_sessions
+            bot.handle_event(VkBotMessageEvent(raw))
+            bot.handle_event(VkBotMessageEvent(raw))
+            self.assertEqual(loader.call_count, loads)
+            self.assertEqual(loader.return_value.flush.call_count, 2)
+            loader.return_value.flush.reset_mock()
+
+    def test_slow_image_does_not_block_other_users(self):
+        import threading
+        from contextlib import contextmanager
+        from chatbot.session_cache import SessionCache
+        from vk_api.bot_longpoll import VkBotMessageEvent
+        transaction_lock = threading.Lock()
+
+        @contextmanager
+        def unit_of_work():
+            # как BEGIN IMMEDIATE в SQLite: одновременно выполняется одна транзакция
+            with transaction_lock:
+                yield
+
+        rendering, release = threading.Event(), threading.Event()
+
+        def render(job):
+            rendering.set()
+            release.wait(timeout=5)
+            return b'ticket'
+
+        def find_intent(utterance, user_id, intent):
+            if user_id == 1:
+                self.bot.send_image_handle(user_id=user_id, image_handler=lambda context: Mock(), context={})
+            return 'ok'
+
+        def event(user_id):
+            message = dict(self.ROW_EVENT['object']['message'], from_id=user_id, peer_id=user_id)
+            return VkBotMessageEvent(dict(self.ROW_EVENT, object={'message': message}))
+
+        with patch('chatbot.bot.logging'):
+            self.bot = ChatBot('', '')
+        loader = Mock(return_value=Mock(scenario_state=None, **{'is_need_to_collect_user_info.return_value': False}))
+        self.bot.dialogs = SessionCache(loader=loader, maxsize=10, ttl=60)
+        self.bot.find_intent = find_intent
+        self.bot.send_message = Mock()
+        self.bot.dialog_to_db = Mock()
+        self.bot.uploader = Mock(**{'get_attachment.return_value': None, 'upload.return_value': 'photo1_2'})
+        self.bot.renderer = Mock(render=render)
+        with patch('chatbot.bot.unit_of_work', unit_of_work):
+            slow = threading.Thread(target=self.bot.message_handling, args=(event(1),))
+            slow.start()
+            self.assertTrue(rendering.wait(timeout=5))
+            fast = threading.Thread(target=self.bot.message_handling, args=(event(2),))
+            fast.start()
+            fast.join(timeout=2)
+            self.assertFalse(fast.is_alive())
+            release.set()
+            slow.join(timeout=5)
+        self.bot.send_message.assert_any_call(user_id=1, attachment='photo1_2')
+        self.assertEqual(self.bot.pending_images, {})
+
+    def test_pool_metrics(self):
+        import chatbot.bot
+        pool = Mock(stats={'in_use': 2, 'idle': 3, 'checkouts': 10, 'wait_avg': 0.25, 'wait_max': 1.5,
+                           'health_check_failures': 1})
+        with patch('chatbot.bot.logging'):
+            bot = ChatBot('', '')
+        with patch('chatbot.bot.get_pool', return_value=pool), patch('chatbot.bot.MetricsServer'):
+            bot.start_metrics_server()
+        text = chatbot.bot.metrics.REGISTRY.render()
+        for line in ('bot_db_pool_in_use 2', 'bot_db_pool_idle 3', 'bot_db_pool_wait_avg 0.25',
+                     'bot_db_pool_wait_max 1.5', 'bot_db_pool_health_check_failures 1'):
+            self.assertIn(line, text.splitlines())
+
+    def test_greeting_uses_cached_session(self):
+        from chatbot.session_cache import SessionCache
+        user = Mock()
+        user.name = 'Владимир'
+        with patch('chatbot.bot.logging'):
+            bot = ChatBot('', '')
+        loader = Mock(return_value=user)
+        bot.dialogs = SessionCache(loader=loader, maxsize=10, ttl=60)
+        for handler, answer in (('handle_hello', 'Привет, Владимир!'), ('handle_polite_hello', ', Владимир!')):
+            message_text = bot.find_intent(utterance=Mock(text='Привет!'), user_id=1,
+                                           intent={'scenario': None, 'handler': handler})
+            self.assertTrue(message_text.endswith(answer))
+        loader.assert_called_once_with(1)
+
     def test_send_message(self):
         pass
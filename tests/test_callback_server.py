@@ -0,0 +1,71 @@
+from chatbot.callback_server import CallbackServer, parse_event
+import asyncio
+import http.client
+import json
+import unittest
+
+GROUP_ID = 1
+EVENT = {'type': 'message_new',
+         'object': {'message': {'date': 1578149090, 'from_id': 8023886, 'id': 1, 'out': 0, 'peer_id': 8023886,
+                                'text': 'Привет!', 'conversation_message_id': 1, 'fwd_messages': [],
+                                'important': False, 'random_id': 0, 'attachments': [], 'is_hidden': False}},
+         'group_id': GROUP_ID,
+         'event_id': '0' * 40,
+         'secret': 'secret'}
+
+
+class TestCallbackServer(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.server = CallbackServer(on_event=self.events.append, group_id=GROUP_ID, confirmation_code='a1b2c3',
+                                     secret='secret', host='127.0.0.1', port=0)
+
+    def post(self, *bodies, path='/callback'):
+        """ Отправка запросов через одно соединение, возвращает список (код ответа, текст) """
+        def client(port):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            responses = []
+            for body in bodies:
+                connection.request('POST', path, body=json.dumps(body).encode('utf-8'),
+                                   headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                responses.append((response.status, response.read().decode('utf-8')))
+            connection.close()
+            return responses
+
+        async def main():
+            await self.server.start()
+            try:
+                return await asyncio.get_event_loop().run_in_executor(None, client, self.server.port)
+            finally:
+                await self.server.stop()
+        return asyncio.run(main())
+
+    def test_confirmation(self):
+        responses = self.post({'type': 'confirmation', 'group_id': GROUP_ID})
+        self.assertEqual(responses, [(200, 'a1b2c3')])
+        self.assertEqual(self.events, [])
+
+    def test_event(self):
+        responses = self.post(EVENT)
+        self.assertEqual(responses, [(200, 'ok')])
+        self.assertEqual(self.events, [EVENT])
+        event = parse_event(self.events[0])
+        self.assertEqual(event.message.text, 'Привет!')
+
+    def test_wrong_secret(self):
+        responses = self.post(dict(EVENT, secret='wrong'), dict(EVENT, group_id=2))
+        self.assertEqual(responses, [(403, 'forbidden'), (403, 'forbidden')])
+        self.assertEqual(self.events, [])
+
+    def test_duplicate_event(self):
+        second = dict(EVENT, event_id='1' * 40)
+        responses = self.post(EVENT, EVENT, second)
+        self.assertEqual(responses, [(200, 'ok')] * 3)
+        self.assertEqual(self.events, [EVENT, second])
+
+    def test_bad_request(self):
+        self.assertEqual(self.server.handle_request(method='POST', path='/callback', body=b'{'), (400, 'bad request'))
+        self.assertEqual(self.server.handle_request(method='GET', path='/callback', body=b''),
+                         (405, 'method not allowed'))
+        self.assertEqual(self.post(EVENT, path='/other'), [(404, 'not found')])
@@ -0,0 +1,121 @@
+from chatbot.database import ConnectionPool, unit_of_work
+import os
+import peewee
+import psycopg2
+import psycopg2.extensions
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+        patcher = patch.object(peewee.PostgresqlDatabase, '_connect', autospec=True, side_effect=self.make_connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_connection(self, database):
+        conn = MagicMock()
+        conn.closed = 0
+        conn.server_version = 120000
+        conn.get_transaction_status.return_value = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.connections.append(conn)
+        return conn
+
+    @staticmethod
+    def make_pool(**kwargs):
+        return ConnectionPool('bot', max_connections=5, stale_timeout=3600, **kwargs)
+
+    def test_warm_up(self):
+        pool = self.make_pool(min_connections=3)
+        pool.warm_up()
+        self.assertEqual(len(self.connections), 3)
+        self.assertEqual(pool.stats['idle'], 3)
+        pool.warm_up()
+        self.assertEqual(len(self.connections), 3)
+
+    def test_dead_connection_discarded(self):
+        pool = self.make_pool(min_connections=1, health_check_interval=30)
+        pool.warm_up()
+        dead, = self.connections
+        dead.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.OperationalError
+        pool._returned[pool.conn_key(dead)] = time.time() - 60
+        pool.connect()
+        self.assertIsNot(pool.connection(), dead)
+        self.assertEqual(len(self.connections), 2)
+        dead.close.assert_called_once_with()
+        self.assertEqual(pool.stats['health_check_failures'], 1)
+        pool.close()
+
+    def test_idle_connections_closed(self):
+        pool = self.make_pool(min_connections=2, idle_timeout=60)
+        pool.warm_up()
+        pool.min_connections = 1
+        for conn in self.connections:
+            pool._returned[pool.conn_key(conn)] = time.time() - 120
+        pool.connect()
+        used = pool.connection()
+        pool.close()
+        self.assertEqual(pool.stats['idle'], 1)
+        self.assertIs(pool._connections[0][1], used)
+        idle, = [conn for conn in self.connections if conn is not used]
+        idle.close.assert_called_once_with()
+        used.close.assert_not_called()
+
+    def test_unit_of_work_commits(self):
+        pool = self.make_pool()
+        with patch('chatbot.database.db_handler', pool):
+            with unit_of_work():
+                pool.execute_sql('UPDATE dialogs SET name = NULL')
+        conn, = self.connections
+        conn.commit.assert_called_once_with()
+        conn.rollback.assert_not_called()
+        self.assertTrue(pool.is_closed())
+        self.assertEqual(pool.stats['idle'], 1)
+        self.assertEqual(pool.stats['in_use'], 0)
+
+    def test_unit_of_work_rolls_back(self):
+        pool = self.make_pool()
+        with patch('chatbot.database.db_handler', pool):
+            with self.assertRaises(ValueError):
+                with unit_of_work():
+                    pool.execute_sql('UPDATE dialogs SET name = NULL')
+                    raise ValueError
+        conn, = self.connections
+        conn.rollback.assert_called_once_with()
+        conn.commit.assert_not_called()
+        self.assertTrue(pool.is_closed())
+        self.assertEqual(pool.stats['idle'], 1)
+        self.assertEqual(pool.stats['in_use'], 0)
+
+
+class TestUnitOfWorkSqlite(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = peewee.SqliteDatabase(os.path.join(directory.name, 'bot.db'))
+        self.database.execute_sql('CREATE TABLE items (name TEXT)')
+        self.database.close()
+        patcher = patch('chatbot.database.db_handler', self.database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def count(self):
+        with self.database.connection_context():
+            return self.database.execute_sql('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def test_commit_and_rollback(self):
+        with unit_of_work():
+            self.database.execute_sql("INSERT INTO items VALUES ('a')")
+        with self.assertRaises(ValueError):
+            with unit_of_work():
+                self.database.execute_sql("INSERT INTO items VALUES ('b')")
+                raise ValueError
+        self.assertTrue(self.database.is_closed())
+        self.assertEqual(self.count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+from chatbot.dialog_writer import LastDialogWriter
+import unittest
+from unittest.mock import MagicMock, patch
+
+
+class TestLastDialogWriter(unittest.TestCase):
+    def setUp(self):
+        self.patchers = [patch('chatbot.dialog_writer.database_model'),
+                         patch('chatbot.dialog_writer.unit_of_work', MagicMock())]
+        self.database_model = self.patchers[0].start()
+        for patcher in self.patchers[1:]:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_coalesced_per_user(self):
+        writer = LastDialogWriter(flush_interval=60, flush_size=100)
+        for user_id in (1, 2, 1, 1):
+            writer.touch(user_id=user_id)
+        writer.flush()
+        self.database_model.upsert_last_dialogs.assert_called_once()
+        last_dialogs = self.database_model.upsert_last_dialogs.call_args[1]['last_dialogs']
+        self.assertEqual(sorted(last_dialogs), [1, 2])
+        writer.flush()
+        self.database_model.upsert_last_dialogs.assert_called_once()
+
+    def test_failed_flush_keeps_rows(self):
+        self.database_model.upsert_last_dialogs.side_effect = [Exception('connection lost'), None]
+        writer = LastDialogWriter(flush_interval=60, flush_size=100)
+        writer.touch(user_id=1)
+        with patch.object(writer, 'log'):
+            writer.flush()
+        writer.touch(user_id=2)
+        writer.flush()
+        self.assertEqual(self.database_model.upsert_last_dialogs.call_count, 2)
+        last_dialogs = self.database_model.upsert_last_dialogs.call_args[1]['last_dialogs']
+        self.assertEqual(sorted(last_dialogs), [1, 2])
+
+    def test_stop_flushes_pending(self):
+        writer = LastDialogWriter(flush_interval=60, flush_size=100)
+        writer.start()
+        writer.touch(user_id=1)
+        writer.stop()
+        self.database_model.upsert_last_dialogs.assert_called_once()
+        self.assertEqual(list(self.database_model.upsert_last_dialogs.call_args[1]['last_dialogs']), [1])
@@ -0,0 +1,54 @@
+from chatbot.dispatcher import OrderedDispatcher
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TestOrderedDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.handled = []
+        self.in_flight = 0
+        self.max_seen = 0
+        self.lock = threading.Lock()
+
+    def handler(self, user_id, number):
+        with self.lock:
+            self.in_flight += 1
+            self.max_seen = max(self.max_seen, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+            self.handled.append((user_id, number))
+
+    def dispatch(self, events, max_in_flight):
+        async def main():
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                dispatcher = OrderedDispatcher(handler=self.handler, max_in_flight=max_in_flight, executor=executor)
+                for user_id, number in events:
+                    dispatcher.submit(user_id, user_id, number)
+                await dispatcher.join()
+        asyncio.run(main())
+
+    def test_user_order(self):
+        events = [(user_id, number) for number in range(5) for user_id in range(4)]
+        self.dispatch(events=events, max_in_flight=4)
+        self.assertEqual(len(self.handled), len(events))
+        for user_id in range(4):
+            numbers = [number for uid, number in self.handled if uid == user_id]
+            self.assertEqual(numbers, list(range(5)))
+
+    def test_max_in_flight(self):
+        events = [(user_id, 0) for user_id in range(8)]
+        self.dispatch(events=events, max_in_flight=2)
+        self.assertEqual(self.max_seen, 2)
+
+    def test_handler_error(self):
+        def handler(user_id, number):
+            if number == 0:
+                raise ValueError
+            self.handled.append((user_id, number))
+        self.handler = handler
+        self.dispatch(events=[(1, 0), (1, 1)], max_in_flight=1)
+        self.assertEqual(self.handled, [(1, 1)])
@@ -0,0 +1,36 @@
+from chatbot.event_cache import UpcomingEventsCache
+import unittest
+from datetime import date
+from unittest.mock import Mock, patch
+
+
+class TestUpcomingEventsCache(unittest.TestCase):
+    def setUp(self):
+        self.events = [Mock(date=date(2020, 4, 1)), Mock(date=date(2020, 6, 25))]
+        self.loader = Mock(return_value=self.events)
+
+    def test_cached_until_ttl(self):
+        cache = UpcomingEventsCache(ttl=60, loader=self.loader)
+        with patch('chatbot.event_cache.date') as today:
+            today.today.return_value = date(2020, 3, 1)
+            self.assertIs(cache.get_closest_event(), self.events[0])
+            self.assertIs(cache.get_closest_event(), self.events[0])
+        self.loader.assert_called_once()
+
+    def test_midnight_rollover(self):
+        cache = UpcomingEventsCache(ttl=60, loader=self.loader)
+        with patch('chatbot.event_cache.date') as today:
+            today.today.return_value = date(2020, 4, 1)
+            self.assertIs(cache.get_closest_event(), self.events[0])
+            today.today.return_value = date(2020, 4, 2)
+            self.assertIs(cache.get_closest_event(), self.events[1])
+            today.today.return_value = date(2020, 6, 26)
+            self.assertIsNone(cache.get_closest_event())
+        self.loader.assert_called_once()
+
+    def test_invalidate(self):
+        cache = UpcomingEventsCache(ttl=60, loader=self.loader)
+        cache.get_events()
+        cache.invalidate()
+        cache.get_events()
+        self.assertEqual(self.loader.call_count, 2)
@@ -0,0 +1,121 @@
+from chatbot.bot import ChatBot
+from chatbot.intent_matcher import IntentMatcher, Utterance, tokenize
+from chatbot import settings
+import random
+import re
+import unittest
+
+UTTERANCES = [
+    'Привет!', 'привет', 'Првиет', 'Здорово', 'здорова, бот', 'Добрый вечер', 'доброе утро!',
+    'Когда будет конференция?', 'Какая дата?', 'Скажи дату', 'кгда', 'Где будет?', 'Адрес подскажи',
+    'какое место?', 'Хочу зарегистрироваться', 'регистрация', 'Как записаться?', 'хочу принять участие',
+    'участвовать', 'Как дела?', 'спасибо', 'ok', '123', '', 'Привет, где и когда будет митап?',
+]
+
+
+def legacy_find_index(intents, text):
+    """ Поиск намерения в том виде, в каком он был в ChatBot.find_intent """
+    for index, intent in enumerate(intents):
+        needed = False
+        if intent['tokens'] is not None:
+            needed = ChatBot.words_matcher(standard=intent['tokens'],
+                                           patterns=re.findall(pattern=r'(\w+)', string=text),
+                                           min_ratio=intent['min_ratio'])
+        elif intent['re_token'] is not None:
+            needed = bool(re.findall(pattern=intent['re_token'], string=text))
+        if needed:
+            return index
+    return None
+
+
+class TestIntentMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = IntentMatcher(intents=settings.INTENTS)
+        rnd = random.Random(73)
+        keywords = [token for intent in settings.INTENTS for token in intent['tokens'] or []]
+        alphabet = ''.join(sorted(set(''.join(keywords)))) + 'xyz'
+        self.words = []
+        for _ in range(2000):
+            word = list(rnd.choice(keywords))
+            for _ in range(rnd.randint(0, 4)):
+                position = rnd.randrange(len(word) + 1)
+                operation = rnd.choice(('insert', 'delete', 'replace'))
+                if operation == 'insert':
+                    word.insert(position, rnd.choice(alphabet))
+                elif word and position < len(word):
+                    if operation == 'delete':
+                        del word[position]
+                    else:
+                        word[position] = rnd.choice(alphabet)
+            self.words.append(''.join(word))
+
+    def test_words_matcher_equivalence(self):
+        for index, intent in enumerate(settings.INTENTS):
+            if intent['tokens'] is None:
+                continue
+            for word in self.words + UTTERANCES:
+                words = tokenize(word)
+                expected = ChatBot.words_matcher(standard=intent['tokens'], patterns=re.findall(r'(\w+)', word),
+                                                 min_ratio=intent['min_ratio'])
+                self.assertEqual(self.matcher.is_words_matched(intent_index=index, words=words), expected,
+                                 msg=f'{intent["name"]}: {word}')
+
+    def test_find_index_equivalence(self):
+        texts = UTTERANCES + [' '.join(self.words[i:i + 3]) for i in range(0, len(self.words), 3)]
+        for text in texts:
+            self.assertEqual(self.matcher.find_index(text=text), legacy_find_index(settings.INTENTS, text),
+                             msg=text)
+
+    def test_match(self):
+        self.assertEqual(self.matcher.match(text='Привет!')['handler'], 'handle_hello')
+        self.assertEqual(self.matcher.match(text='Добрый вечер')['handler'], 'handle_polite_hello')
+        self.assertIsNone(self.matcher.match(text='спасибо'))
+
+    def test_regex_router_priority(self):
+        rnd = random.Random(20)
+        intents = []
+        for number in range(300):
+            if number % 10 == 0:
+                intents.append({'name': f'tokens{number}', 'tokens': [f'слово{number}'], 'min_ratio': 0.9,
+                                're_token': None})
+            else:
+                pattern = re.compile(f'(?:{rnd.choice("абвгд")}{number}|ряд {number % 7}(ой|ый)?)',
+                                     flags=rnd.choice((0, re.IGNORECASE)))
+                intents.append({'name': f're{number}', 'tokens': None, 'min_ratio': None, 're_token': pattern})
+        matcher = IntentMatcher(intents=intents)
+        self.assertIsNotNone(matcher._router)
+        texts = [f'{rnd.choice("абвгдАБВГД")}{rnd.randrange(300)} и РЯД {rnd.randrange(9)}ой, слово{rnd.randrange(300)}'
+                 for _ in range(500)] + ['ничего', '']
+        for text in texts:
+            self.assertEqual(matcher.find_index(text=text), legacy_find_index(intents, text), msg=text)
+
+    def test_regex_router_fallback(self):
+        intents = [{'name': 'repeat', 'tokens': None, 'min_ratio': None, 're_token': re.compile(r'(а)\1')},
+                   {'name': 'hello', 'tokens': None, 'min_ratio': None, 're_token': 'привет'}]
+        matcher = IntentMatcher(intents=intents)
+        self.assertIsNone(matcher._router)
+        self.assertEqual(matcher.find_index(text='аа привет'), 0)
+        self.assertEqual(matcher.find_index(text='а привет'), 1)
+
+    def test_batch_equivalence(self):
+        texts = UTTERANCES * 3 + [' '.join(self.words[i:i + 3]) for i in range(0, 600, 3)]
+        expected = [self.matcher.find_index(text=text) for text in texts]
+        self.assertEqual(IntentMatcher(intents=settings.INTENTS).find_indexes(texts=texts), expected)
+        self.assertEqual(self.matcher.match_batch(texts=['Привет!', 'спасибо'])[0]['handler'], 'handle_hello')
+
+    def test_utterance(self):
+        utterance = Utterance('  Привет,   где  БУДЕТ митап? ')
+        self.assertEqual(utterance.text, 'Привет, где БУДЕТ митап?')
+        self.assertEqual(utterance.words, ['привет', 'где', 'будет', 'митап'])
+
+    def test_decision_cache(self):
+        matcher = IntentMatcher(intents=settings.INTENTS, decision_cache_size=2)
+        self.assertEqual(matcher.match(text='Привет!')['handler'], 'handle_hello')
+        self.assertEqual(matcher.match(text=' Привет! ')['handler'], 'handle_hello')
+        self.assertIsNone(matcher.match(text='спасибо'))
+        self.assertIsNone(matcher.match(text='спасибо'))
+        self.assertEqual(matcher.decisions.stats, {'size': 2, 'hits': 2, 'misses': 2, 'hit_rate': 0.5})
+        matcher.match(text='Где?')
+        self.assertEqual(len(matcher.decisions), 2)
+        matcher.decisions.clear()
+        self.assertEqual(matcher.decisions.stats['size'], 0)
@@ -0,0 +1,44 @@
+from chatbot.log_handlers import GzipRotatingFileHandler, NonBlockingQueueHandler, queued_file_handler
+import gzip
+import logging
+import os
+import queue
+import tempfile
+import unittest
+
+
+class TestLogHandlers(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'bot.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def make_record(level, message):
+        return logging.LogRecord('bot', level, __file__, 0, message, None, None)
+
+    def test_rotation_compresses(self):
+        handler = GzipRotatingFileHandler(self.filename, maxBytes=100, backupCount=2, encoding='UTF-8')
+        for number in range(10):
+            handler.emit(self.make_record(logging.INFO, f'message {number} ' + 'x' * 40))
+        handler.close()
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ['bot.log', 'bot.log.1.gz', 'bot.log.2.gz'])
+        with gzip.open(self.filename + '.1.gz', 'rt', encoding='UTF-8') as archive:
+            self.assertIn('message 8', archive.read())
+
+    def test_full_queue_drops_debug(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(self.make_record(logging.INFO, 'info'))
+        handler.handle(self.make_record(logging.DEBUG, 'debug'))
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_queued_file_handler(self):
+        handler = queued_file_handler(self.filename, encoding='UTF-8', queue_size=100)
+        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        handler.handle(self.make_record(logging.INFO, 'message from user 1: Привет!'))
+        handler.close()
+        with open(self.filename, encoding='UTF-8') as log_file:
+            self.assertEqual(log_file.read(), 'INFO: message from user 1: Привет!\n')
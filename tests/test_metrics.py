@@ -0,0 +1,59 @@
+from chatbot.metrics import Counter, Histogram, MetricsRegistry, MetricsServer, timed
+import unittest
+from unittest.mock import Mock, patch
+from urllib.request import urlopen
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_render(self):
+        histogram = Histogram('stage_seconds', 'Stage latency', ['stage'], buckets=(0.1, 1.0))
+        histogram.observe(0.05, 'find_intent')
+        histogram.observe(0.5, 'find_intent')
+        histogram.observe(5, 'find_intent')
+        lines = histogram.collect()
+        self.assertIn('# TYPE stage_seconds histogram', lines)
+        self.assertIn('stage_seconds_bucket{stage="find_intent",le="0.1"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="find_intent",le="1.0"} 2', lines)
+        self.assertIn('stage_seconds_bucket{stage="find_intent",le="+Inf"} 3', lines)
+        self.assertIn('stage_seconds_sum{stage="find_intent"} 5.55', lines)
+        self.assertIn('stage_seconds_count{stage="find_intent"} 3', lines)
+
+    def test_counter_render(self):
+        counter = Counter('errors_total', 'Errors', ['name'])
+        counter.inc('get_user_info')
+        counter.inc('get_user_info', amount=2)
+        self.assertIn('errors_total{name="get_user_info"} 3', counter.collect())
+
+    def test_timed_disabled(self):
+        func = Mock()
+        with patch('chatbot.metrics.ENABLED', False):
+            self.assertIs(timed(Histogram('h', 'h', ['stage']))(func), func)
+
+    def test_timed_enabled(self):
+        histogram = Histogram('h', 'h', ['stage'])
+
+        def find_intent():
+            return 'answer'
+
+        def failing():
+            raise ValueError
+
+        with patch('chatbot.metrics.ENABLED', True), patch('chatbot.metrics.ERRORS') as errors:
+            self.assertEqual(timed(histogram)(find_intent)(), 'answer')
+            with self.assertRaises(ValueError):
+                timed(histogram, 'render_ticket')(failing)()
+        self.assertEqual(histogram.get_count('find_intent'), 1)
+        self.assertEqual(histogram.get_count('render_ticket'), 1)
+        errors.inc.assert_called_once_with('render_ticket')
+
+    def test_server(self):
+        registry = MetricsRegistry()
+        registry.register(Counter('messages_total', 'Messages')).inc()
+        server = MetricsServer(host='127.0.0.1', port=0, registry=registry)
+        server.start()
+        try:
+            with urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+                body = response.read().decode('utf-8')
+        finally:
+            server.stop()
+        self.assertIn('messages_total 1', body.splitlines())
@@ -0,0 +1,71 @@
+from chatbot.fake_vk import FakeVk
+from chatbot.outbox import VkOutbox
+import unittest
+
+
+class TestVkOutbox(unittest.TestCase):
+    def setUp(self):
+        self.vk = FakeVk()
+
+    def make_outbox(self, **kwargs):
+        params = {'vk': self.vk, 'rate': 100, 'max_retries': 5, 'backoff': 0.01}
+        params.update(kwargs)
+        return VkOutbox(**params)
+
+    def test_execute_batching(self):
+        outbox = self.make_outbox()
+        futures = [outbox.call('messages.send', user_id=user_id, message=f'Привет, "{user_id}"!', attachment=None)
+                   for user_id in range(30)]
+        self.assertEqual(outbox.queue_depth, 30)
+        outbox.start()
+        outbox.stop()
+        self.assertEqual(self.vk.requests, ['execute', 'execute'])
+        self.assertEqual(len({future.result() for future in futures}), 30)
+        self.assertEqual([message['user_id'] for message in self.vk.messages], list(range(30)))
+        self.assertNotIn('attachment', self.vk.messages[0])
+        self.assertEqual(outbox.stats['sent'], 30)
+        self.assertEqual(outbox.stats['queue_depth'], 0)
+
+    def test_retry_throttled_call(self):
+        self.vk.call_errors.extend([None, 6])
+        outbox = self.make_outbox()
+        futures = [outbox.call('messages.send', user_id=user_id, message='Привет!') for user_id in range(3)]
+        outbox.start()
+        outbox.stop()
+        self.assertTrue(all(future.result() for future in futures))
+        self.assertEqual(outbox.stats['retried'], 1)
+        self.assertEqual(len(self.vk.messages), 3)
+
+    def test_retry_rate_limited_request(self):
+        self.vk.rate_limit = 1
+        outbox = self.make_outbox(batch_size=1, backoff=0.3)
+        outbox.start()
+        futures = [outbox.call('messages.send', user_id=user_id, message='Привет!') for user_id in range(2)]
+        results = [future.result(timeout=5) for future in futures]
+        outbox.stop()
+        self.assertEqual(len(results), 2)
+        self.assertGreater(outbox.stats['retried'], 0)
+
+    def test_call_error(self):
+        self.vk.call_errors.extend([None, 901])
+        outbox = self.make_outbox()
+        futures = [outbox.call('messages.send', user_id=user_id, message='Привет!') for user_id in range(2)]
+        outbox.start()
+        outbox.stop()
+        self.assertIsNotNone(futures[0].result())
+        self.assertEqual(futures[1].exception().code, 901)
+        self.assertEqual(outbox.stats['failed'], 1)
+
+    def test_retry_keeps_peer_order(self):
+        self.vk.call_errors.extend([6])
+        outbox = self.make_outbox()
+        futures = [outbox.call('messages.send', user_id=1, message='первое'),
+                   outbox.call('messages.send', user_id=1, message='второе'),
+                   outbox.call('messages.send', user_id=2, message='другому')]
+        outbox.start()
+        outbox.stop()
+        self.assertTrue(all(future.result() for future in futures))
+        self.assertEqual(outbox.stats['retried'], 1)
+        self.assertEqual([message['message'] for message in self.vk.messages if message['user_id'] == 1],
+                         ['первое', 'второе'])
+        self.assertEqual(outbox.stats['queue_depth'], 0)
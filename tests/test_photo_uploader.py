@@ -0,0 +1,69 @@
+from chatbot.fake_vk import FakeVk
+from chatbot.photo_uploader import PhotoUploader, PhotoUploadError
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+
+class TestPhotoUploader(unittest.TestCase):
+    def setUp(self):
+        self.vk = FakeVk()
+        patcher = patch('chatbot.photo_uploader.database_model')
+        self.database_model = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('chatbot.photo_uploader.unit_of_work', MagicMock())
+        self.database = patcher.start().return_value.__enter__.return_value
+        self.addCleanup(patcher.stop)
+        self.database.in_transaction.return_value = False
+        self.database_model.get_photo_attachment.return_value = None
+        self.uploader = PhotoUploader(api=self.vk.get_api(), session=self.vk.http, upload_url_ttl=600,
+                                      upload_timeout=30, cache_size=10, cache_ttl=60)
+
+    def test_upload_saves_attachment(self):
+        attachment = self.uploader.upload(image=b'ticket', content_hash='fingerprint')
+        self.assertTrue(attachment.startswith('photo'))
+        self.assertEqual(self.vk.http.uploads, 1)
+        self.database_model.save_photo_attachment.assert_called_once_with(content_hash='fingerprint',
+                                                                          attachment=attachment)
+        self.database_model.get_photo_attachment.reset_mock()
+        self.assertEqual(self.uploader.get_attachment('fingerprint'), attachment)
+        self.assertEqual(self.uploader.upload(image=b'ticket', content_hash='fingerprint'), attachment)
+        self.database_model.get_photo_attachment.assert_not_called()
+        self.assertEqual(self.vk.http.uploads, 1)
+
+    def test_upload_without_lookup(self):
+        attachment = self.uploader.upload(image=b'ticket', content_hash='fingerprint', lookup=False)
+        self.assertTrue(attachment.startswith('photo'))
+        self.database_model.get_photo_attachment.assert_not_called()
+        self.assertEqual(self.uploader.get_attachment('fingerprint'), attachment)
+
+    def test_upload_failed(self):
+        self.vk.http.post = Mock(return_value=Mock(**{'json.return_value': {'photo': '[]'}}))
+        with self.assertRaises(PhotoUploadError):
+            self.uploader.upload(image=b'ticket', content_hash='fingerprint')
+        self.assertEqual(self.vk.http.post.call_count, 2)
+        self.assertNotIn('photos.saveMessagesPhoto', self.vk.requests)
+        self.database_model.save_photo_attachment.assert_not_called()
+
+    def test_not_cached_before_commit(self):
+        self.database.in_transaction.return_value = True
+        attachment = self.uploader.upload(image=b'ticket', content_hash='fingerprint', lookup=False)
+        self.database_model.save_photo_attachment.assert_called_once_with(content_hash='fingerprint',
+                                                                          attachment=attachment)
+        self.assertEqual(self.uploader._attachments.stats['size'], 0)
+        self.database_model.get_photo_attachment.return_value = attachment
+        self.assertEqual(self.uploader.get_attachment('fingerprint'), attachment)
+        self.database_model.get_photo_attachment.assert_called_once_with('fingerprint')
+
+    def test_fingerprint_miss(self):
+        self.assertIsNone(self.uploader.get_attachment('fingerprint'))
+        self.assertIsNone(self.uploader.get_attachment('fingerprint'))
+        self.assertEqual(self.database_model.get_photo_attachment.call_count, 2)
+        self.assertEqual(self.uploader._attachments.stats['size'], 0)
+
+    def test_fingerprint_found_in_db(self):
+        self.database_model.get_photo_attachment.return_value = 'photo1_2'
+        self.assertEqual(self.uploader.upload(image=b'ticket', content_hash='fingerprint'), 'photo1_2')
+        self.assertEqual(self.uploader.get_attachment('fingerprint'), 'photo1_2')
+        self.database_model.get_photo_attachment.assert_called_once_with('fingerprint')
+        self.assertEqual(self.vk.http.uploads, 0)
+        self.database_model.save_photo_attachment.assert_not_called()
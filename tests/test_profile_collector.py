@@ -0,0 +1,66 @@
+from chatbot.bot import ChatBot
+from chatbot.fake_vk import FakeVk
+from chatbot.outbox import VkOutbox
+from chatbot.profile_collector import ProfileCollector
+from chatbot.vk_user import VkUser
+import unittest
+from unittest.mock import MagicMock, Mock, patch
+
+
+class TestProfileCollector(unittest.TestCase):
+    def setUp(self):
+        self.vk = FakeVk()
+        self.outbox = VkOutbox(vk=self.vk, rate=100, max_retries=0, backoff=0.01)
+        self.outbox.start()
+        self.addCleanup(self.outbox.stop)
+        self.patchers = [patch('chatbot.profile_collector.database_model'),
+                         patch('chatbot.profile_collector.unit_of_work', MagicMock())]
+        self.database_model = self.patchers[0].start()
+        self.patchers[1].start()
+        for patcher in self.patchers:
+            self.addCleanup(patcher.stop)
+
+    def test_batching(self):
+        on_collected = Mock()
+        collector = ProfileCollector(outbox=self.outbox, api_version='5.103', flush_interval=60, batch_size=2,
+                                     on_collected=on_collected)
+        for user_id in (1, 2, 3, 2, 4, 5):
+            collector.add(user_id=user_id)
+        collector.collect()
+        self.assertEqual(self.vk.requests.count('users.get'), 3)
+        collected = dict()
+        for call in self.database_model.update_user_names.call_args_list:
+            self.assertLessEqual(len(call[1]['user_names']), 2)
+            collected.update(call[1]['user_names'])
+        self.assertEqual(collected, {user_id: f'Фамилия{user_id} Имя' for user_id in range(1, 6)})
+        self.assertEqual(on_collected.call_count, 3)
+
+    def test_failed_batch_requeued(self):
+        self.database_model.update_user_names.side_effect = [Exception('connection lost'), None]
+        collector = ProfileCollector(outbox=self.outbox, api_version='5.103', flush_interval=60)
+        collector.add(user_id=1)
+        collector.add(user_id=2)
+        with patch.object(collector, 'log'):
+            collector.collect()
+        self.assertEqual(collector._pending, {1, 2})
+        collector.collect()
+        self.assertEqual(self.database_model.update_user_names.call_args[1]['user_names'],
+                         {1: 'Фамилия1 Имя', 2: 'Фамилия2 Имя'})
+        self.assertEqual(collector._pending, set())
+
+    def test_names_propagated_to_sessions(self):
+        with patch('chatbot.bot.logging'), patch('chatbot.vk_user.database_model') as vk_user_model:
+            vk_user_model.get_user_info.return_value = {'user_name': None, 'name': None, 'email': None,
+                                                        'scenario_state': None}
+            bot = ChatBot('', 1)
+            user = VkUser(user_id=1)
+            bot.dialogs.put(1, user)
+            collector = ProfileCollector(outbox=self.outbox, api_version='5.103', flush_interval=60,
+                                         on_collected=bot.update_user_names)
+            collector.add(user_id=1)
+            collector.add(user_id=2)
+            collector.collect()
+            self.assertEqual(user.user_name, 'Фамилия1 Имя')
+            self.assertFalse(user.has_changes)
+            self.assertIsNone(bot.dialogs.peek(2))
+            vk_user_model.get_user_info.assert_called_once_with(user_id=1, create=True)
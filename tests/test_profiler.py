@@ -0,0 +1,64 @@
+from chatbot.profiler import SamplingProfiler
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def message_handling(delay=0.0):
+        if delay:
+            time.sleep(delay)
+        return 'answer'
+
+    def test_disabled(self):
+        profiler = SamplingProfiler(directory=self.path, enabled=False, every=1, slow_threshold=None)
+        handler = profiler.profile(self.message_handling)
+        self.assertEqual(handler(), 'answer')
+        self.assertEqual(list(self.path.iterdir()), [])
+
+    def test_every_nth_call(self):
+        profiler = SamplingProfiler(directory=self.path, enabled=True, every=2, slow_threshold=None)
+        handler = profiler.profile(self.message_handling)
+        for _ in range(5):
+            self.assertEqual(handler(), 'answer')
+        self.assertEqual(len(list(self.path.glob('*.prof'))), 2)
+        summaries = list(self.path.glob('*.txt'))
+        self.assertEqual(len(summaries), 2)
+        summary = summaries[0].read_text(encoding='UTF-8')
+        self.assertTrue(summary.startswith('message_handling:'))
+        self.assertIn('function calls', summary)
+
+    def test_slow_threshold(self):
+        profiler = SamplingProfiler(directory=self.path, enabled=True, every=0, slow_threshold=0.05)
+        handler = profiler.profile(self.message_handling)
+        handler()
+        handler(delay=0.06)
+        dumps = list(self.path.glob('*.prof'))
+        self.assertEqual(len(dumps), 1)
+        self.assertIn('-slow-', dumps[0].name)
+
+    def test_rotation(self):
+        profiler = SamplingProfiler(directory=self.path, enabled=True, every=1, slow_threshold=None, max_dumps=3)
+        handler = profiler.profile(self.message_handling)
+        for _ in range(5):
+            handler()
+        dumps = sorted(dump.name for dump in self.path.glob('*.prof'))
+        self.assertEqual(len(dumps), 3)
+        self.assertTrue(all(f'-{number:06d}-' in dump for number, dump in zip((3, 4, 5), dumps)))
+        self.assertEqual(len(list(self.path.glob('*.txt'))), 3)
+
+    def test_toggle(self):
+        profiler = SamplingProfiler(directory=self.path, enabled=False)
+        profiler.toggle()
+        self.assertTrue(profiler.enabled)
+        profiler.toggle()
+        self.assertFalse(profiler.enabled)
@@ -0,0 +1,25 @@
+from chatbot.render_service import RenderQueueFullError, RenderService
+from chatbot.ticket_maker import TicketJob
+import unittest
+
+JOB = TicketJob(title='Конференция Moscow Python Meetup №73',
+                location='01.04.2020, БЦ "Олимпия Парк", Ленинградское ш. 39Ас2',
+                note='Регистрация с 10:00 до 11:00', name='Владимир', email='vladimir@example.com')
+
+
+class TestRenderService(unittest.TestCase):
+    def setUp(self):
+        self.renderer = RenderService(max_workers=1, max_queue=1, timeout=60)
+
+    def tearDown(self):
+        self.renderer.shutdown()
+
+    def test_render_in_pool(self):
+        image = self.renderer.render(JOB)
+        self.assertTrue(image.startswith(b'\x89PNG\r\n\x1a\n'))
+
+    def test_queue_full(self):
+        future = self.renderer.submit(JOB)
+        with self.assertRaises(RenderQueueFullError):
+            self.renderer.submit(JOB)
+        self.assertTrue(future.result(timeout=60).startswith(b'\x89PNG'))
@@ -0,0 +1,61 @@
+from chatbot import handlers
+from chatbot.scenario import ScenarioConfigError, compile_scenarios, validate_intents
+from chatbot.settings import INTENTS, SCENARIOS
+import copy
+import unittest
+
+
+class TestScenario(unittest.TestCase):
+    def setUp(self):
+        self.scenarios = copy.deepcopy(SCENARIOS)
+        self.steps = self.scenarios['registration']['steps']
+
+    def assertConfigError(self, message):
+        with self.assertRaises(ScenarioConfigError) as context:
+            compile_scenarios(scenarios=self.scenarios, handlers=handlers)
+        self.assertIn(message, str(context.exception))
+
+    def test_compile(self):
+        scenarios = compile_scenarios(scenarios=self.scenarios, handlers=handlers)
+        validate_intents(intents=INTENTS, scenarios=scenarios, handlers=handlers)
+        registration = scenarios['registration']
+        step = registration.first_step
+        self.assertEqual(step.name, 'step1')
+        self.assertIs(step.handler, handlers.handle_name)
+        self.assertIs(step.next_step.next_step, registration.get_step('step3'))
+        self.assertTrue(registration.get_step('step3').is_final)
+        self.assertIs(registration.get_step('step3').send_image, handlers.generate_ticket)
+        with self.assertRaises(AttributeError):
+            step.next_step = None
+
+    def test_unknown_handler(self):
+        self.steps['step2']['handler'] = 'handle_emial'
+        self.assertConfigError("registration.step2: unknown handler 'handle_emial'")
+
+    def test_unknown_next_step(self):
+        self.steps['step1']['next_step'] = 'step_2'
+        self.assertConfigError("registration.step1: unknown next step 'step_2'")
+
+    def test_unreachable_step(self):
+        self.steps['step2']['next_step'] = None
+        self.assertConfigError("registration: unreachable steps ['step3']")
+
+    def test_no_final_step(self):
+        self.steps['step3']['next_step'] = 'step1'
+        self.steps['step3']['error_response'] = 'error'
+        self.assertConfigError('registration: scenario has no final step')
+
+    def test_step_without_context(self):
+        del self.steps['step2']['context']
+        self.assertConfigError('registration.step2: step has no context')
+
+    def test_scenario_without_steps(self):
+        del self.scenarios['registration']['steps']
+        self.assertConfigError('registration: scenario has no steps')
+
+    def test_intent_with_unknown_scenario(self):
+        scenarios = compile_scenarios(scenarios=self.scenarios, handlers=handlers)
+        intents = [{'name': 'Регистрация', 'scenario': 'registraton', 'handler': None}]
+        with self.assertRaises(ScenarioConfigError) as context:
+            validate_intents(intents=intents, scenarios=scenarios, handlers=handlers)
+        self.assertIn("unknown scenario 'registraton'", str(context.exception))
@@ -0,0 +1,45 @@
+from chatbot.session_cache import SessionCache
+import unittest
+from unittest.mock import Mock, patch
+
+
+class TestSessionCache(unittest.TestCase):
+    def setUp(self):
+        self.loader = Mock(side_effect=lambda key: {'user_id': key})
+
+    def test_hit_and_miss(self):
+        cache = SessionCache(loader=self.loader, maxsize=10, ttl=60)
+        self.assertEqual(cache[1], {'user_id': 1})
+        self.assertEqual(cache[1], {'user_id': 1})
+        self.loader.assert_called_once_with(1)
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+
+    def test_lru_eviction(self):
+        cache = SessionCache(loader=self.loader, maxsize=2, ttl=60)
+        cache.get(1)
+        cache.get(2)
+        cache.get(1)
+        cache.get(3)
+        self.assertIn(1, cache)
+        self.assertNotIn(2, cache)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_ttl_expiration(self):
+        cache = SessionCache(loader=self.loader, maxsize=10, ttl=60)
+        with patch('chatbot.session_cache.time.monotonic', return_value=0):
+            cache.get(1)
+        with patch('chatbot.session_cache.time.monotonic', return_value=61):
+            cache.get(1)
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertEqual(cache.stats['expirations'], 1)
+
+    def test_missing_value_not_cached(self):
+        loader = Mock(return_value=None)
+        cache = SessionCache(loader=loader, maxsize=10, ttl=60)
+        self.assertIsNone(cache.get(1))
+        self.assertNotIn(1, cache)
+        self.assertEqual(len(cache), 0)
+        cache.get(1)
+        self.assertEqual(loader.call_count, 2)
@@ -0,0 +1,30 @@
+from chatbot import ticket_maker
+from chatbot.ticket_maker import TicketJob, TicketMaker, get_base_layer, load_template, render_ticket
+import unittest
+from unittest.mock import patch
+
+EVENT = {'title': 'Конференция Moscow Python Meetup №73',
+         'location': '01.04.2020, БЦ "Олимпия Парк", Ленинградское ш. 39Ас2',
+         'note': 'Регистрация с 10:00 до 11:00'}
+
+
+class TestTicketMaker(unittest.TestCase):
+    def setUp(self):
+        ticket_maker._base_layers.clear()
+
+    def test_base_layer_reused(self):
+        with patch('chatbot.ticket_maker.TicketMaker.write_title', autospec=True,
+                   side_effect=TicketMaker.write_title) as write_title:
+            first = render_ticket(TicketJob(name='Владимир', email='vladimir@example.com', **EVENT))
+            second = render_ticket(TicketJob(name='Мария', email='maria@example.com', **EVENT))
+        write_title.assert_called_once()
+        self.assertNotEqual(first, second)
+        self.assertIs(get_base_layer(**EVENT), get_base_layer(**EVENT))
+        self.assertIs(load_template(), load_template())
+
+    def test_changed_event_new_layer(self):
+        layer = get_base_layer(**EVENT)
+        changed = get_base_layer(**dict(EVENT, location='02.04.2020, Москва'))
+        self.assertIsNot(changed, layer)
+        self.assertNotEqual(changed.tobytes(), layer.tobytes())
+        self.assertEqual(len(ticket_maker._base_layers), 2)
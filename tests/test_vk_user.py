@@ -0,0 +1,35 @@
+from chatbot.vk_user import UserState, VkUser
+import unittest
+from unittest.mock import patch
+
+
+class TestVkUser(unittest.TestCase):
+    def setUp(self):
+        self.user_info = {'user_name': None, 'name': None, 'email': None, 'scenario_state': None}
+
+    def test_changes_flushed_in_one_update(self):
+        with patch('chatbot.vk_user.database_model') as database_model:
+            database_model.get_user_info.return_value = self.user_info
+            user = VkUser(user_id=8023886)
+            user.name = 'Владимир'
+            user.email = 'vovka@mail.ru'
+            user.scenario_state = UserState(scenario_name='registration', step_name='step2')
+            database_model.update_dialog.assert_not_called()
+            self.assertTrue(user.has_changes)
+            user.flush()
+            database_model.update_dialog.assert_called_once_with(
+                user_id=8023886,
+                name='Владимир',
+                email='vovka@mail.ru',
+                scenario_state={'scenario_name': 'registration', 'step_name': 'step2', 'context': {}}
+            )
+            self.assertFalse(user.has_changes)
+            user.flush()
+            database_model.update_dialog.assert_called_once()
+
+    def test_context_manager(self):
+        with patch('chatbot.vk_user.database_model') as database_model:
+            database_model.get_user_info.return_value = self.user_info
+            with VkUser(user_id=8023886) as user:
+                user.scenario_state = None
+            database_model.update_dialog.assert_called_once_with(user_id=8023886, scenario_state=None)
@@ -1,8 +1,13 @@
+import hashlib
+import json
 import textwrap
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
 from io import BytesIO
 
-import requests
 from PIL import ImageDraw, ImageFont, Image
+from avatar import avatar_cache
 from settings import WORK_DIR
 
 TICKET_DIR = WORK_DIR / 'ticket'
@@ -40,13 +45,117 @@ NOTE_OFFSET = (75, 787)
 NOTE_LINE_WIDTH = 750
 NOTE_CHARS_PER_LINE = 150
 
+BASE_LAYERS_CACHE_SIZE = 8
+TICKET_RENDER_VERSION = 1
+
+_template = None
+_base_layers = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class TicketJob(namedtuple('TicketJob', ['title', 'location', 'note', 'name', 'email'])):
+    """ Задание на отрисовку билета: все данные, от которых зависит результат """
+    __slots__ = ()
+
+    @property
+    def fingerprint(self):
+        """
+        Хэш задания: для одинаковых заданий рисуются одинаковые билеты.
+        TICKET_RENDER_VERSION нужно увеличивать при изменении шаблона или разметки билета.
+
+        :rtype str
+        """
+        data = json.dumps([TICKET_RENDER_VERSION] + list(self), ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=32)
+def get_font(font_path, font_size):
+    """
+    Получить шрифт. Файл шрифта разбирается один раз для каждого размера.
+
+    :param str font_path: Путь к файлу шрифта
+    :param int font_size: Размер шрифта
+    :rtype PIL.ImageFont.FreeTypeFont
+    """
+    return ImageFont.truetype(font=font_path, size=font_size)
+
+
+@lru_cache(maxsize=4096)
+def get_text_size(font_path, font_size, text):
+    """
+    Получить размер текста в пикселях. Результат запоминается.
+
+    :param str font_path: Путь к файлу шрифта
+    :param int font_size: Размер шрифта
+    :param str text: Текст
+    :return tuple: (ширина, высота)
+    """
+    return get_font(font_path=font_path, font_size=font_size).getsize(text)
+
+
+def load_template():
+    """
+    Получить раскодированный шаблон билета. Файл читается один раз.
+
+    :rtype PIL.Image.Image
+    """
+    global _template
+    with _cache_lock:
+        if _template is None:
+            template = Image.open(TICKET_TEMPLATE)
+            template.load()
+            _template = template
+        return _template
+
+
+def get_base_layer(title, location, note):
+    """
+    Получить подложку билета с общими для всех участников мероприятия данными.
+    Подложки кэшируются по содержимому: при изменении данных мероприятия создается новая.
+
+    :param str title: Название мероприятия
+    :param str location: Дата и место проведения
+    :param str note: Примечание
+    :rtype PIL.Image.Image
+    """
+    key = (title, location, note)
+    with _cache_lock:
+        if key in _base_layers:
+            _base_layers.move_to_end(key)
+            return _base_layers[key]
+    ticket = TicketMaker()
+    ticket.write_title(title=title)
+    ticket.write_location(location=location)
+    ticket.write_note(note=note)
+    with _cache_lock:
+        _base_layers[key] = ticket.template
+        while len(_base_layers) > BASE_LAYERS_CACHE_SIZE:
+            _base_layers.popitem(last=False)
+    return ticket.template
+
 
 class TicketMaker:
     """ Класс создания билета на мероприятие по шаблону """
-    def __init__(self):
-        self.template = Image.open(str(TICKET_TEMPLATE))
+    def __init__(self, template=None):
+        """
+        :param PIL.Image.Image template: Подложка билета. По умолчанию - чистый шаблон.
+        """
+        self.template = (template or load_template()).copy()
         self.draw = ImageDraw.Draw(im=self.template, mode=self.template.mode)
 
+    @classmethod
+    def for_event(cls, title, location, note):
+        """
+        Создать билет на подложке мероприятия (см. get_base_layer)
+
+        :param str title: Название мероприятия
+        :param str location: Дата и место проведения
+        :param str note: Примечание
+        :rtype TicketMaker
+        """
+        return cls(template=get_base_layer(title=title, location=location, note=note))
+
     def write(self, text, xy, font_size, color=BLACK_COLOR, line_width=None, chars_per_line=None, align=None):
         """
         Размещение текста на шаблоне по заданным параметрам
@@ -60,19 +169,20 @@ class TicketMaker:
         :param str align: Выравнивание относительно края
         """
         x, y = xy
-        font = ImageFont.truetype(font=FONT, size=font_size)
+        font = get_font(font_path=FONT, font_size=font_size)
         line_spacing = font_size * 0.2
-        line_width = line_width or font.getsize(text)[0]
+        line_width = line_width or get_text_size(font_path=FONT, font_size=font_size, text=text)[0]
         chars_per_line = chars_per_line or len(text)
         for line in textwrap.wrap(text=text, width=chars_per_line):
+            text_width, text_height = get_text_size(font_path=FONT, font_size=font_size, text=line)
             if align == ALIGN_CENTER:
-                text_position = ((line_width - font.getsize(line)[0]) / 2 + x, y)
+                text_position = ((line_width - text_width) / 2 + x, y)
             elif align == ALIGN_RIGHT:
-                text_position = (line_width - font.getsize(line)[0], y)
+                text_position = (line_width - text_width, y)
             else:
                 text_position = (x, y)
             self.draw.text(xy=text_position, text=line, font=font, fill=color)
-            y += font.getsize(line)[1] + line_spacing
+            y += text_height + line_spacing
 
     def write_title(self, title):
         """ Размещение названия мероприятия """
@@ -96,11 +206,10 @@ class TicketMaker:
 
     def draw_avatar(self, ava_str):
         """
-        Размещение аватара
+        Размещение аватара (формируется локально, см. avatar.py)
         :param str ava_str: Строка, относительно которой будет формироваться аватар
         """
-        response = requests.get(f'https://api.adorable.io/avatars/{AVATAR_SIZE}/{ava_str}')
-        avatar = Image.open(BytesIO(response.content))
+        avatar = avatar_cache.get(seed=ava_str, size=AVATAR_SIZE)
         self.template.paste(avatar, AVATAR_OFFSET)
 
     def show(self):
@@ -120,6 +229,19 @@ class TicketMaker:
         return _t
 
 
+def render_ticket(job):
+    """
+    Отрисовка билета по заданию. Используется в процессах RenderService.
+
+    :param TicketJob job: Задание на отрисовку
+    :return bytes: Билет в формате PNG
+    """
+    ticket = TicketMaker.for_event(title=job.title, location=job.location, note=job.note)
+    ticket.write_name(name=job.name)
+    ticket.draw_avatar(job.email)
+    return ticket.image_io.getvalue()
+
+
 if __name__ == '__main__':
 
     title = 'Конференция Moscow Python Meetup №73'
@@ -15,7 +15,8 @@ class VkUser:
         """
         Пользователь ВК.
         Расширенный вариант. Работает с БД, которая пополняется ботом.
-        Все данные, получаемые экземпляром класса, сохраняются в БД.
+        Все данные, получаемые экземпляром класса, сохраняются в БД: изменения накапливаются
+        и записываются одним запросом при вызове flush() или при выходе из блока with.
 
         :param int user_id: id пользователя
         """
@@ -24,11 +25,19 @@ class VkUser:
         self._name = None
         self._email = None
         self._scenario_state = None
+        self._changes = dict()
         self._sync_user_info_with_db()
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
     def _sync_user_info_with_db(self):
         """ Получить данные о пользователе из БД """
-        info = database_model.get_user_info(user_id=self.user_id)
+        info = database_model.get_user_info(user_id=self.user_id, create=True)
         self._user_name = info['user_name']
         self._name = info['name']
         self._email = info['email']
@@ -52,7 +61,7 @@ class VkUser:
 
     @user_name.setter
     def user_name(self, value):
-        database_model.update_dialog(user_id=self.user_id, **{'user_name': value})
+        self._changes['user_name'] = value
         self._user_name = value
 
     @property
@@ -61,7 +70,7 @@ class VkUser:
 
     @name.setter
     def name(self, value):
-        database_model.update_dialog(user_id=self.user_id, **{'name': value})
+        self._changes['name'] = value
         self._name = value
 
     @property
@@ -70,7 +79,7 @@ class VkUser:
 
     @email.setter
     def email(self, value):
-        database_model.update_dialog(user_id=self.user_id, **{'email': value})
+        self._changes['email'] = value
         self._email = value
 
     @property
@@ -79,16 +88,43 @@ class VkUser:
 
     @scenario_state.setter
     def scenario_state(self, value):
-        if not isinstance(value, UserState) and value is None:
-            UserStateError('User state must be a UserState instance or NoneType')
-        if isinstance(value, UserState):
-            database_model.update_user_state(user_id=self.user_id,
-                                             scenario_name=value.scenario_name, step_name=value.step_name,
-                                             context=value.context)
-        elif value is None:
-            database_model.clear_user_state(user_id=self.user_id)
+        if value is not None and not isinstance(value, UserState):
+            raise UserStateError('User state must be a UserState instance or NoneType')
+        self._changes['scenario_state'] = value
         self._scenario_state = value
 
+    @property
+    def has_changes(self):
+        """ Есть ли не записанные в БД изменения """
+        return bool(self._changes)
+
+    def flush(self):
+        """ Записать накопленные изменения в БД одним запросом """
+        if not self._changes:
+            return
+        changes = dict(self._changes)
+        state = changes.get('scenario_state')
+        if isinstance(state, UserState):
+            changes['scenario_state'] = {'scenario_name': state.scenario_name,
+                                         'step_name': state.step_name,
+                                         'context': state.context}
+        database_model.update_dialog(user_id=self.user_id, **changes)
+        self._changes.clear()
+
+    def refresh(self, **values):
+        """
+        Обновить данные, уже записанные в БД другим способом (без повторной записи)
+
+        :param values: Значения полей user_name, name, email
+        """
+        for field, value in values.items():
+            setattr(self, f'_{field}', value)
+
+    def discard(self):
+        """ Отменить накопленные изменения, перечитав данные из БД """
+        self._changes.clear()
+        self._sync_user_info_with_db()
+
     def is_need_to_collect_user_info(self):
         return not all([self.user_name])
 